@@ -0,0 +1,55 @@
+"""
+    Backup and restore the database
+        python backup.py --env prod create
+        python backup.py --env prod list
+        python backup.py --env prod restore backups/db.prod-20240101-120000.db
+"""
+
+import argparse
+import logging
+import sys
+import dotenv
+from src.db import backup
+
+
+def print_progress(status, remaining, total):
+    print(f"\r{total - remaining}/{total} pages", end="", flush=True)
+
+
+def process_args():
+    parser = argparse.ArgumentParser(description="Backup and restore the database")
+    parser.add_argument(
+        "-e",
+        "--env",
+        default="dev",
+        help="Set environment. Default is dev",
+        choices=["dev", "prod"],
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("create", help="Make a backup now")
+    subparsers.add_parser("list", help="List backups, oldest first")
+    restore_parser = subparsers.add_parser(
+        "restore", help="Replace the database with a backup. Close the app first"
+    )
+    restore_parser.add_argument("snapshot", help="Path of the backup to restore")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = process_args()
+    dotenv.load_dotenv(dotenv_path=f".env.{args.env}", override=True)
+    logging.basicConfig(level="INFO", stream=sys.stdout)
+    if args.command == "create":
+        path = backup.create_backup(progress=print_progress)
+        print(f"\nBackup written to {path}")
+    elif args.command == "list":
+        for path in backup.list_snapshots():
+            print(path)
+    elif args.command == "restore":
+        choice = input(
+            f"This replaces {backup.get_db_file()} with {args.snapshot}. Continue? (y/n): "
+        )
+        if choice != "y":
+            exit(1)
+        backup.restore_backup(args.snapshot, progress=print_progress)
+        print(f"\nRestored {args.snapshot}")
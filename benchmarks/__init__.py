@@ -0,0 +1,9 @@
+"""
+    Benchmarks of the data functions, run against a throwaway database.
+    It is set up when the package is imported, so before the benchmark modules
+    import the modules that open the database
+"""
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
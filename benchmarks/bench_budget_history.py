@@ -0,0 +1,98 @@
+"""
+    get_budget_history_df: per month x category loop against vectorized BudgetIndex lookups.
+    The index and result cache are reset before each call, so both are rebuilt
+        python -m benchmarks.bench_budget_history
+"""
+
+import random
+from datetime import datetime
+import pandas as pd
+from benchmarks.common import measure, report
+from src.db.dbmanager import DBManager, from_cents, to_cents
+from src.db import data_summarizer
+from src.db.data_summarizer import get_budget_history_df
+from src.db.budget_index import invalidate_budget_index
+from src.db.result_cache import result_cache
+
+YEARS = 8
+# chance that a category gets a new budget in a given month
+CHANGE_PROBABILITY = 0.3
+
+
+def legacy_get_budget_history_df():
+    """
+    get_budget_history_df before it was vectorized, without the debug logging
+    """
+    db = data_summarizer.db
+    dates = db.select("SELECT DISTINCT START_DATE AS Month FROM Budgets", [])
+    budgets = db.select("SELECT b.CATEGORY, b.AMOUNT, b.START_DATE FROM Budgets b", [])
+    dates_df = pd.DataFrame(dates, columns=["month"])
+    budgets_df = pd.DataFrame(budgets, columns=["category", "amount", "start_date"])
+    budgets_df["amount"] = from_cents(budgets_df["amount"])
+    budgets_df["start_date"] = pd.to_datetime(budgets_df["start_date"], format="%Y-%m")
+    for month in dates_df["month"]:
+        month = datetime.strptime(month, "%Y-%m")
+        for category in budgets_df["category"].unique():
+            budget = budgets_df[
+                (budgets_df["category"] == category)
+                & (budgets_df["start_date"] == month)
+            ]
+            if not budget.empty:
+                continue
+            prev_budget = budgets_df[
+                (budgets_df["category"] == category)
+                & (budgets_df["start_date"] < month)
+            ]
+            prev_budget = prev_budget[
+                prev_budget["start_date"] == prev_budget["start_date"].max()
+            ]
+            if prev_budget.empty:
+                budgets_df.loc[len(budgets_df.index)] = [category, 0, month]
+            else:
+                prev_budget = prev_budget.iloc[0]
+                budgets_df.loc[len(budgets_df.index)] = [
+                    category,
+                    prev_budget["amount"],
+                    month,
+                ]
+    budgets_df.sort_values(["category", "start_date"], inplace=True)
+    budgets_df["start_date"] = budgets_df["start_date"].apply(
+        lambda x: x.strftime("%Y-%m")
+    )
+    return budgets_df
+
+
+def seed(db: DBManager):
+    random.seed(0)
+    rows = db.select("SELECT category FROM categories WHERE income = 0", [])
+    categories = [row[0] for row in rows]
+    rows = []
+    for year in range(2024 - YEARS, 2024):
+        for month in range(1, 13):
+            for category in categories:
+                if random.random() < CHANGE_PROBABILITY:
+                    amount = to_cents(random.randint(50, 1000))
+                    rows.append((category, amount, f"{year}-{month:02d}"))
+    db.insert_many(
+        "INSERT INTO budgets (category, amount, start_date) VALUES (?, ?, ?)", rows
+    )
+    return len(rows), len(categories)
+
+
+if __name__ == "__main__":
+    budgets, categories = seed(DBManager())
+    print(f"{budgets} budgets, {categories} categories over {YEARS} years")
+    expected = legacy_get_budget_history_df().reset_index(drop=True)
+    actual = get_budget_history_df()
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
+    def uncached():
+        invalidate_budget_index()
+        result_cache.clear()
+        return get_budget_history_df()
+
+    report(
+        "get_budget_history_df",
+        measure(legacy_get_budget_history_df, repeat=3),
+        measure(uncached),
+    )
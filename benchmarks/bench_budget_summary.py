@@ -0,0 +1,132 @@
+"""
+    Budget summary of every month: the correlated MAX(start_date) lookup joined to
+    the transactions, against get_budget_summary_df, which reads the month from the
+    spending cube and the budgets from BudgetIndex.
+    Both are built once, before the timed runs
+        python -m benchmarks.bench_budget_summary
+"""
+
+import random
+from datetime import date, timedelta
+from benchmarks.common import measure, report
+from src.db.dbmanager import DBManager, to_cents
+from src.db.dates import day_num
+from src.db.data_summarizer import get_budget_summary_df
+
+YEARS = 8
+TRANSACTIONS_PER_DAY = 50
+# chance that a category gets a new budget in a given month
+CHANGE_PROBABILITY = 0.3
+
+LEGACY_BUDGET_SUMMARY = """
+    WITH BUDGETSINCEDATE AS (
+        SELECT c.CATEGORY, COALESCE(b.amount, 0) AS AMOUNT
+        FROM CATEGORIES c
+        LEFT OUTER JOIN Budgets b ON b.category = c.category
+        WHERE c.INCOME = 0 AND (
+            b.start_date IS NULL
+            OR b.start_date = (
+                SELECT MAX(b2.start_date)
+                FROM Budgets b2
+                WHERE b2.start_date <= :month
+                AND b2.category = c.category
+            )
+        )
+    ),
+
+    TRANSACTIONSBUDGET AS (
+        SELECT b.CATEGORY AS Category, b.AMOUNT AS Budget,
+            COALESCE(SUM(t.amount),0) AS Actual, b.AMOUNT - COALESCE(SUM(t.amount),0) AS Remaining
+        FROM BUDGETSINCEDATE b
+        LEFT OUTER JOIN TRANSACTIONS t ON (
+            t.category = b.category AND
+            t.date >= :month || '-01' AND
+            t.date <= :month || '-31'
+        )
+        GROUP BY b.CATEGORY
+        ORDER BY Remaining ASC
+    )
+
+    SELECT Category, Budget, Actual, Remaining
+    FROM TRANSACTIONSBUDGET
+    WHERE Actual > 0 OR budget > 0
+    ;
+"""
+
+
+def seed(db: DBManager) -> list[str]:
+    """
+    Returns the seeded months
+    """
+    random.seed(0)
+    rows = db.select("SELECT category FROM categories", [])
+    categories = [row[0] for row in rows]
+    start = date(2024 - YEARS, 1, 1)
+    transactions = []
+    for offset in range((date(2024, 1, 1) - start).days):
+        day = (start + timedelta(days=offset)).isoformat()
+        for _ in range(TRANSACTIONS_PER_DAY):
+            amount = random.randint(100, 20000)
+            category = random.choice(categories)
+            transactions.append((day, "bench", amount, category, day_num(day)))
+    with db.transaction():
+        db.insert_many(
+            """
+                INSERT INTO transactions (date, description, amount, category, day_num)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+            transactions,
+        )
+    months = [
+        f"{year}-{month:02d}"
+        for year in range(2024 - YEARS, 2024)
+        for month in range(1, 13)
+    ]
+    budgets = []
+    for i, month in enumerate(months):
+        for category in categories:
+            # every category has a budget from the first month, so both summaries agree
+            if i == 0 or random.random() < CHANGE_PROBABILITY:
+                budgets.append((category, to_cents(random.randint(50, 1000)), month))
+    db.insert_many(
+        "INSERT INTO budgets (category, amount, start_date) VALUES (?, ?, ?)", budgets
+    )
+    print(
+        f"{len(transactions)} transactions, {len(budgets)} budgets over {YEARS} years"
+    )
+    return months
+
+
+if __name__ == "__main__":
+    db = DBManager()
+    months = seed(db)
+    db.select("ANALYZE", [])
+    # uncached, every call runs its query
+    get_summary = get_budget_summary_df.__wrapped__
+
+    def legacy():
+        for month in months:
+            db.select(LEGACY_BUDGET_SUMMARY, {"month": month})
+
+    def budget_index():
+        for month in months:
+            get_summary(month)
+
+    # also builds the spending cube and BudgetIndex
+    for month in months:
+        expected = db.select(LEGACY_BUDGET_SUMMARY, {"month": month})
+        actual = [
+            (
+                row.Category,
+                to_cents(row.Budget),
+                to_cents(row.Actual),
+                to_cents(row.Remaining),
+            )
+            for row in get_summary(month).itertuples(index=False)
+        ]
+        assert sorted(expected) == sorted(actual), month
+    report(
+        f"budget summary of {len(months)} months",
+        measure(legacy),
+        measure(budget_index),
+    )
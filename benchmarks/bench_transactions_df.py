@@ -0,0 +1,93 @@
+"""
+    Post-processing of the transactions listing: per row .apply lambdas
+    against vectorized operations and categoricals
+        python -m benchmarks.bench_transactions_df
+"""
+
+import random
+import pandas as pd
+from benchmarks.common import measure, report
+from src.db.dbmanager import DBManager, from_cents
+from src.db.dates import day_num
+from src.db.queries import QUERIES
+from src.db.data_summarizer import TRANSACTIONS_COLUMNS, transactions_rows_to_df
+
+TRANSACTIONS = 200_000
+FILES = 40
+
+
+def legacy_transactions_rows_to_df(transactions):
+    """
+    transactions_rows_to_df before it was vectorized.
+    With pandas' string dtype a missing filename is NaN, which the lambda took for a path
+    """
+    df = pd.DataFrame(transactions, columns=TRANSACTIONS_COLUMNS)
+    df["amount"] = from_cents(df["amount"])
+    df["inferred category"] = df["inferred category"].apply(
+        lambda x: "No" if x == 0 else "Yes"
+    )
+    df["filename"] = df["filename"].apply(
+        lambda x: x.split("/")[-1].split("\\")[-1] if pd.notna(x) and x else "No file"
+    )
+    return df
+
+
+def seed(db: DBManager):
+    random.seed(0)
+    rows = db.select("SELECT category FROM categories", [])
+    categories = [row[0] for row in rows]
+    file_ids = [
+        db.insert(
+            "INSERT INTO files (filename) VALUES (?)",
+            [f"C:\\Users\\me\\statements/2023/statement-{i}.csv"],
+        )
+        for i in range(FILES)
+    ]
+    transactions = []
+    for i in range(TRANSACTIONS):
+        year, month, day = (
+            random.randint(2016, 2023),
+            random.randint(1, 12),
+            random.randint(1, 28),
+        )
+        day = f"{year}-{month:02d}-{day:02d}"
+        transactions.append(
+            (
+                day,
+                f"transaction {i}",
+                random.randint(100, 20000),
+                random.choice(categories),
+                random.random() < 0.3,
+                # a third of the transactions are entered by hand
+                random.choice(file_ids) if random.random() < 0.66 else None,
+                day_num(day),
+            )
+        )
+    with db.transaction():
+        db.insert_many(
+            """
+                INSERT INTO transactions (date, description, amount, category,
+                    inferred_category, file_id, day_num)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            transactions,
+        )
+
+
+if __name__ == "__main__":
+    db = DBManager()
+    seed(db)
+    rows = db.select(QUERIES.get("transactions"), [])
+    print(f"{len(rows)} transactions")
+    expected = legacy_transactions_rows_to_df(rows)
+    actual = transactions_rows_to_df(rows)
+    pd.testing.assert_frame_equal(expected, actual.astype(object), check_dtype=False)
+    print(
+        f"memory: before {expected.memory_usage(deep=True).sum() / 1e6:.1f}MB, "
+        f"after {actual.memory_usage(deep=True).sum() / 1e6:.1f}MB"
+    )
+    report(
+        "transactions_rows_to_df",
+        measure(lambda: legacy_transactions_rows_to_df(rows)),
+        measure(lambda: transactions_rows_to_df(rows)),
+    )
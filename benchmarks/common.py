@@ -0,0 +1,42 @@
+"""
+    Helpers shared by the benchmarks.
+    Benchmarks run against a throwaway database, run them from the repo root:
+        python -m benchmarks.bench_budget_history
+"""
+
+import os
+import tempfile
+import time
+import statistics
+
+
+def use_temp_database() -> str:
+    """
+    Point DB_FILE at a new database in a temporary directory.
+    Must be called before importing modules that open the database,
+    the benchmarks package calls it when imported
+    """
+    db_file = os.path.join(tempfile.mkdtemp(prefix="budget-bench-"), "bench.db")
+    os.environ["DB_FILE"] = db_file
+    # seeding is expected to be slow, keep it out of the slow query log
+    os.environ.setdefault("DB_SLOW_QUERY_MS", "60000")
+    return db_file
+
+
+def measure(func: callable, repeat: int = 5) -> float:
+    """
+    Median wall time of func, in ms
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def report(name: str, baseline_ms: float, optimized_ms: float):
+    print(
+        f"{name}: before {baseline_ms:.2f}ms, after {optimized_ms:.2f}ms, "
+        f"{baseline_ms / optimized_ms:.1f}x faster"
+    )
@@ -0,0 +1,48 @@
+"""
+    Run the database maintenance now, instead of waiting for the app to be idle
+        python maintenance.py --env prod run
+        python maintenance.py --env prod convert-vacuum
+"""
+
+import argparse
+import logging
+import sys
+import dotenv
+from src.db.dbmanager import DBManager
+from src.db.maintenance import Maintenance, convert_to_incremental_vacuum
+
+
+def process_args():
+    parser = argparse.ArgumentParser(description="Database maintenance")
+    parser.add_argument(
+        "-e",
+        "--env",
+        default="dev",
+        help="Set environment. Default is dev",
+        choices=["dev", "prod"],
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "run",
+        help="Refresh the planner statistics and vacuum freed pages. "
+        "The change logs are only trimmed by the app",
+    )
+    subparsers.add_parser(
+        "convert-vacuum",
+        help="Rewrite a database created without auto_vacuum = INCREMENTAL, "
+        "so freed pages can be vacuumed. Close the app first",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = process_args()
+    dotenv.load_dotenv(dotenv_path=f".env.{args.env}", override=True)
+    logging.basicConfig(level="INFO", stream=sys.stdout)
+    db = DBManager()
+    if args.command == "run":
+        Maintenance(db).run_for(float("inf"))
+    elif args.command == "convert-vacuum":
+        if not convert_to_incremental_vacuum(db):
+            print("Nothing to convert")
+    DBManager.close_all()
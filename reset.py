@@ -2,8 +2,10 @@
     Setup database
 """
 
+import os
 import dotenv
 from src.db.dbmanager import DBManager
+from src.db.backup import create_backup
 
 TABLES = [
     "transactions",
@@ -12,6 +14,10 @@ TABLES = [
     "currencies",
     "budgets",
     "files",
+    "monthly_category_totals",
+    "transactions_fts",
+    "spending_changes",
+    "daily_spending_changes",
 ]
 
 if __name__ == "__main__":
@@ -23,10 +29,12 @@ if __name__ == "__main__":
         dotenv.load_dotenv(dotenv_path=".env.dev")
     elif choice == "2":
         choice = input(
-            "Are you sure? This is production databse. Did you backup? (y/n): "
+            "Are you sure? This is production databse. A backup will be made first. (y/n): "
         )
         if choice == "y":
             dotenv.load_dotenv(dotenv_path=".env.prod")
+            if os.path.exists(os.getenv("DB_FILE", "")):
+                print(f"Backup written to {create_backup()}")
     else:
         print("Invalid choice")
         exit(1)
@@ -34,6 +42,8 @@ if __name__ == "__main__":
     db = DBManager()
     for table in TABLES:
         db.delete(f"DROP TABLE IF EXISTS {table}", ())
+    db.reset_schema_version()
 
     # create tables
     db.setup()
+    DBManager.close_all()
@@ -1,15 +1,26 @@
+import os
+import logging
+from datetime import datetime
 import tkinter as tk
 from tkinter import ttk
 from tkinter.constants import VERTICAL, Y, RIGHT, FALSE, LEFT, BOTH, TRUE, NW
 from tkinter import messagebox
 import matplotlib.pyplot as plt
 from screeninfo import get_monitors
-from src.pages import Home, Transactions, Budget, Files, Categories
+from src.pages import Home, Year, Transactions, Budget, Files, Categories
 from src.nav import NavFrame
 from src.constants import TKINTER_BACKGROUND_COLOR
+from src.db.dbmanager import DBManager
+from src.db.async_data import loader
+from src.db.result_cache import result_cache
+from src.db.backup import BackupScheduler
+from src.db.maintenance import MaintenanceScheduler
+
+logger = logging.getLogger("main").getChild(__name__)
 
 PAGES = [
     Home,
+    Year,
     Transactions,
     Budget,
     Files,
@@ -85,6 +96,8 @@ class BudgetApp(tk.Tk):
 
         self.current_frame = None
         self.show_frame(PAGES[0])
+        # dump database statistics
+        self.bind("<F12>", lambda event: self.dump_query_stats())
 
     def show_frame(self, frame_class):
         if self.current_frame:
@@ -94,6 +107,18 @@ class BudgetApp(tk.Tk):
         frame.pack(fill="both", expand=True)
         self.current_frame = frame
 
+    def dump_query_stats(self):
+        report = "\n".join(
+            [DBManager().dump_query_stats(), f"result cache: {result_cache.stats()}"]
+        )
+        if not os.path.exists("logs"):
+            os.makedirs("logs")
+        filename = f"logs/query-stats-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.txt"
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(report)
+        logger.info("Query stats written to %s\n%s", filename, report)
+        return filename
+
     def get_display_size(self):
         # get the height and width of the display
         monitor = get_monitors()[0]
@@ -104,11 +129,21 @@ def run():
     app = BudgetApp()
     app.title("Budget App")
     app.configure(bg=TKINTER_BACKGROUND_COLOR)
+    backup_scheduler = BackupScheduler()
+    backup_scheduler.start()
+    maintenance_scheduler = MaintenanceScheduler(app)
+    maintenance_scheduler.start()
 
     def on_closing():
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
             app.destroy()
             plt.close("all")
+            loader.shutdown()
+            backup_scheduler.stop()
+            maintenance_scheduler.shutdown()
+            logger.info("Query stats on shutdown:\n%s", DBManager().dump_query_stats())
+            logger.info("Result cache stats on shutdown: %s", result_cache.stats())
+            DBManager.close_all()
 
     app.protocol("WM_DELETE_WINDOW", on_closing)
     app.mainloop()
@@ -0,0 +1,80 @@
+"""
+    Run database and pandas work off the Tk main thread.
+    Work is submitted to a small thread pool and returns a Future.
+    when_done polls the future with widget.after, so callbacks run on the Tk thread
+    and the event loop is never blocked.
+
+        future = loader.submit(get_budget_summary_df, month)
+        when_done(frame, future, lambda df: show(df))
+"""
+
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+
+POLL_INTERVAL_MS = 50
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+class AsyncDataLoader:
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # created lazily, so importing this module does not start threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="db-worker"
+            )
+        return self._executor
+
+    def submit(self, func: callable, *args, **kwargs) -> Future:
+        return self._get_executor().submit(func, *args, **kwargs)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def log_error(error: BaseException):
+    logger.error(
+        "Error loading data: %s\n%s",
+        error,
+        "".join(traceback.format_exception(error)),
+    )
+
+
+def when_done(
+    widget,
+    future: Future,
+    on_success: callable,
+    on_error: callable = log_error,
+    poll_ms: int = POLL_INTERVAL_MS,
+):
+    """
+    Call on_success(result) or on_error(exception) on the Tk thread once the future is done.
+    Nothing is called if the widget was destroyed in the meantime
+    """
+
+    def poll():
+        if not widget.winfo_exists():
+            future.cancel()
+            return
+        if not future.done():
+            widget.after(poll_ms, poll)
+            return
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            on_error(error)
+        else:
+            on_success(future.result())
+
+    widget.after(poll_ms, poll)
+
+
+loader = AsyncDataLoader()
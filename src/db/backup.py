@@ -0,0 +1,240 @@
+"""
+    Online backups of the database with the SQLite backup API.
+    The copy is made a few pages at a time, and the source is only locked while a step runs,
+    so a backup can run on a background thread while the app keeps reading and writing.
+    Snapshots are written to DB_BACKUP_DIR as <database name>-<timestamp>.db and the oldest
+    ones are removed so that only DB_BACKUP_KEEP remain.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime
+
+DEFAULT_BACKUP_DIR = "backups"
+DEFAULT_KEEP = 7
+DEFAULT_INTERVAL_HOURS = 24
+# pages copied per step, -1 copies everything in a single step
+DEFAULT_PAGES_PER_STEP = 256
+# pause between steps, gives other connections a chance to take the lock
+DEFAULT_STEP_SLEEP = 0.005
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+SNAPSHOT_PATTERN = re.compile(r"^(.+)-(\d{8}-\d{6})\.db$")
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+class BackupError(Exception):
+    pass
+
+
+def get_backup_dir() -> str:
+    return os.getenv("DB_BACKUP_DIR", DEFAULT_BACKUP_DIR)
+
+
+def get_db_file() -> str:
+    db_file = os.getenv("DB_FILE")
+    if not db_file:
+        raise BackupError("Database file not specified")
+    return db_file
+
+
+def snapshot_name(db_file: str, when: datetime = None) -> str:
+    name = os.path.splitext(os.path.basename(db_file))[0]
+    return f"{name}-{(when or datetime.now()).strftime(TIMESTAMP_FORMAT)}.db"
+
+
+def list_snapshots(db_file: str = None, backup_dir: str = None) -> list[str]:
+    """
+    Paths of the snapshots of db_file, oldest first
+    """
+    db_file = db_file or get_db_file()
+    backup_dir = backup_dir or get_backup_dir()
+    if not os.path.isdir(backup_dir):
+        return []
+    name = os.path.splitext(os.path.basename(db_file))[0]
+    snapshots = []
+    for filename in os.listdir(backup_dir):
+        match = SNAPSHOT_PATTERN.match(filename)
+        if match and match.group(1) == name:
+            snapshots.append((match.group(2), os.path.join(backup_dir, filename)))
+    snapshots.sort()
+    return [path for _, path in snapshots]
+
+
+def log_progress(status, remaining, total):
+    logger.debug("Backup progress: %s/%s pages copied", total - remaining, total)
+
+
+def copy_database(
+    source_file: str,
+    dest_file: str,
+    pages: int = DEFAULT_PAGES_PER_STEP,
+    sleep: float = DEFAULT_STEP_SLEEP,
+    progress: callable = log_progress,
+):
+    """
+    Copy source_file to dest_file with the backup API, `pages` pages per step.
+    progress(status, remaining, total) is called after every step.
+    The copy is written next to dest_file and renamed once it is complete and checked,
+    so dest_file is never left half written
+    """
+    partial_file = dest_file + ".partial"
+    if os.path.exists(partial_file):
+        os.remove(partial_file)
+    source = sqlite3.connect(source_file)
+    dest = sqlite3.connect(partial_file)
+    try:
+        # a write by another connection between steps restarts the copy,
+        # writes from the app are short and rare enough for it to finish
+        source.backup(dest, pages=pages, progress=progress, sleep=sleep)
+        result = dest.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"Copy of {source_file} failed integrity check: {result}")
+        # the copy keeps the journal mode of the source, a snapshot is a single file
+        dest.execute("PRAGMA journal_mode = DELETE")
+    except (sqlite3.Error, BackupError):
+        dest.close()
+        os.remove(partial_file)
+        raise
+    finally:
+        source.close()
+    dest.close()
+    os.replace(partial_file, dest_file)
+
+
+def create_backup(
+    db_file: str = None,
+    backup_dir: str = None,
+    keep: int = None,
+    pages: int = DEFAULT_PAGES_PER_STEP,
+    progress: callable = log_progress,
+) -> str:
+    """
+    Write a new snapshot of the database, then remove the oldest ones so `keep` remain.
+    Returns the path of the snapshot
+    """
+    db_file = db_file or get_db_file()
+    backup_dir = backup_dir or get_backup_dir()
+    if keep is None:
+        keep = int(os.getenv("DB_BACKUP_KEEP", str(DEFAULT_KEEP)))
+    if not os.path.exists(db_file):
+        raise BackupError(f"Database {db_file} does not exist")
+    if not os.path.exists(backup_dir):
+        os.makedirs(backup_dir)
+    path = os.path.join(backup_dir, snapshot_name(db_file))
+    start = time.perf_counter()
+    copy_database(db_file, path, pages=pages, progress=progress)
+    logger.info(
+        "Backed up %s to %s (%.1f MB) in %.2fs",
+        db_file,
+        path,
+        os.path.getsize(path) / 1e6,
+        time.perf_counter() - start,
+    )
+    rotate(db_file, backup_dir, keep)
+    return path
+
+
+def rotate(db_file: str = None, backup_dir: str = None, keep: int = DEFAULT_KEEP):
+    """
+    Delete all but the `keep` most recent snapshots
+    """
+    snapshots = list_snapshots(db_file, backup_dir)
+    for path in snapshots[: max(len(snapshots) - keep, 0)]:
+        os.remove(path)
+        logger.info("Removed old backup %s", path)
+
+
+def restore_backup(
+    snapshot: str, db_file: str = None, progress: callable = log_progress
+):
+    """
+    Overwrite the database with a snapshot.
+    The app must not be running: the pages are replaced under any open connection.
+    The current database is backed up first, so a restore can be undone
+    """
+    db_file = db_file or get_db_file()
+    if not os.path.exists(snapshot):
+        raise BackupError(f"Backup {snapshot} does not exist")
+    source = sqlite3.connect(snapshot)
+    try:
+        result = source.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"Backup {snapshot} failed integrity check: {result}")
+        if os.path.exists(db_file):
+            # named so it is not listed or rotated with the regular snapshots
+            backup_dir = get_backup_dir()
+            if not os.path.exists(backup_dir):
+                os.makedirs(backup_dir)
+            undo = os.path.join(
+                backup_dir, "pre-restore-" + snapshot_name(db_file)
+            )
+            copy_database(db_file, undo, progress=progress)
+            logger.info("Backed up %s to %s before restoring", db_file, undo)
+        # the backup API writes through sqlite, so the WAL of the database is reset too
+        dest = sqlite3.connect(db_file)
+        try:
+            source.backup(dest, progress=progress)
+        finally:
+            dest.close()
+    finally:
+        source.close()
+    logger.info("Restored %s from %s", db_file, snapshot)
+
+
+class BackupScheduler:
+    """
+    Background thread making a backup every interval_hours, with rotation.
+    The first backup is made when the last snapshot is older than the interval
+    """
+
+    def __init__(
+        self,
+        db_file: str = None,
+        backup_dir: str = None,
+        interval_hours: float = None,
+        keep: int = None,
+    ):
+        self.db_file = db_file or get_db_file()
+        self.backup_dir = backup_dir or get_backup_dir()
+        if interval_hours is None:
+            interval_hours = float(
+                os.getenv("DB_BACKUP_INTERVAL_HOURS", str(DEFAULT_INTERVAL_HOURS))
+            )
+        self.interval = interval_hours * 3600
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread = None
+
+    def seconds_until_next(self) -> float:
+        snapshots = list_snapshots(self.db_file, self.backup_dir)
+        if not snapshots:
+            return 0
+        age = time.time() - os.path.getmtime(snapshots[-1])
+        return max(self.interval - age, 0)
+
+    def run(self):
+        while not self._stop.wait(self.seconds_until_next()):
+            try:
+                create_backup(self.db_file, self.backup_dir, self.keep)
+            except (sqlite3.Error, BackupError, OSError) as e:
+                logger.error("Scheduled backup failed: %s", e)
+                # try again at the next interval instead of in a loop
+                if self._stop.wait(self.interval):
+                    return
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self.run, name="db-backup", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
@@ -0,0 +1,131 @@
+"""
+    In-memory index of the budgets, answering "which budget applies to category C at month M".
+    Budgets are kept as one array sorted by (category, start month), so a lookup is a
+    binary search, and many (category, month) pairs are looked up with a single np.searchsorted.
+    A budget applies from its start month until the category gets a new one.
+
+        index = get_budget_index()
+        index.lookup("Groceries", "2024-03")
+        index.lookup_many(["Groceries", "Rent"], ["2024-03", "2024-04"])
+
+    The index is built on first use and rebuilt after invalidate_budget_index(),
+    which the budget forms call after each write.
+"""
+
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from src.db.dbmanager import DBManager
+from src.db.dates import str_month_keys
+
+# room for every month key YYYYMM, so (category, month) pairs sort as a single integer
+CATEGORY_STRIDE = 10**6
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+class BudgetIndex:
+    # index used by the app, built on first use
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, categories, start_dates, amounts):
+        """
+        categories, start_dates ("YYYY-MM") and amounts (cents): one item per budget
+        """
+        self.categories, codes = np.unique(
+            np.asarray(categories, dtype=object), return_inverse=True
+        )
+        keys = codes.astype(np.int64) * CATEGORY_STRIDE + str_month_keys(start_dates)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.codes = codes[order]
+        self.amounts = np.asarray(amounts, dtype=np.int64)[order]
+        self.start_keys = self.keys % CATEGORY_STRIDE
+        self._codes_by_category = {
+            category: code for code, category in enumerate(self.categories)
+        }
+
+    @classmethod
+    def load(cls, db: DBManager = None):
+        rows = (db or DBManager()).select(
+            "SELECT CATEGORY, START_DATE, AMOUNT FROM BUDGETS", []
+        )
+        return cls(
+            [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+        )
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def lookup(self, category: str, month: str) -> int:
+        """
+        Budget of category in month, in cents. 0 before its first budget
+        """
+        return int(self.lookup_many([category], [month])[0])
+
+    def lookup_many(self, categories, months) -> np.ndarray:
+        """
+        Budget in cents of each (categories[i], months[i]) pair.
+        months are "YYYY-MM" strings or month keys (YYYYMM).
+        The arguments are broadcast, so either may be a single value
+        """
+        categories = np.asarray(categories, dtype=object)
+        months = np.asarray(months)
+        # pairs repeat few distinct values: convert those, then spread them back
+        labels, uniques = pd.factorize(categories.reshape(-1))
+        unique_codes = np.array(
+            [self._codes_by_category.get(c, -1) for c in uniques], dtype=np.int64
+        )
+        codes = unique_codes[labels].reshape(categories.shape)
+        if months.dtype.kind not in "iu":
+            labels, uniques = pd.factorize(months.reshape(-1))
+            months = str_month_keys(uniques.astype(str))[labels].reshape(months.shape)
+        codes, months = np.broadcast_arrays(codes, months)
+        if not len(self):
+            return np.zeros(codes.shape, dtype=np.int64)
+        keys = codes * CATEGORY_STRIDE + months
+        # last budget starting at or before the month, if it is of the same category
+        positions = np.searchsorted(self.keys, keys, side="right") - 1
+        clipped = np.maximum(positions, 0)
+        found = (positions >= 0) & (codes >= 0) & (self.codes[clipped] == codes)
+        return np.where(found, self.amounts[clipped], 0)
+
+    def history(self, category: str):
+        """
+        (start month keys, amounts) of the budgets of category, in start order
+        """
+        code = self._codes_by_category.get(category)
+        if code is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        start, end = np.searchsorted(
+            self.keys, [code * CATEGORY_STRIDE, (code + 1) * CATEGORY_STRIDE]
+        )
+        return self.start_keys[start:end], self.amounts[start:end]
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.load()
+                logger.debug("Built budget index of %s budgets", len(cls._shared))
+            return cls._shared
+
+    @classmethod
+    def invalidate(cls):
+        with cls._shared_lock:
+            cls._shared = None
+
+
+def get_budget_index() -> BudgetIndex:
+    return BudgetIndex.shared()
+
+
+def invalidate_budget_index():
+    """
+    Call after writing to BUDGETS, the index is rebuilt on its next use
+    """
+    BudgetIndex.invalidate()
+    # results cached while the old index was in use are keyed on the previous version
+    DBManager.invalidate_cached_results()
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import time
+import logging
+from sqlite3 import Error
+
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+class PoolExhaustedError(Error):
+    """
+    Raised when every connection in the pool is owned by a live thread
+    and none is released before the timeout
+    """
+
+
+class ConnectionPool:
+    """
+    Pool of long lived sqlite connections, one per thread.
+    A thread keeps its connection until it calls release(), or until it dies
+    and its slot is reclaimed by another thread.
+    """
+
+    def __init__(
+        self,
+        db: str,
+        max_size: int = 4,
+        timeout: float = 5.0,
+        on_connect: callable = None,
+        cached_statements: int = 128,
+    ):
+        self.db = db
+        self.cached_statements = cached_statements
+        self.max_size = max_size
+        self.timeout = timeout
+        # called with each new connection, e.g. to apply pragmas
+        self.on_connect = on_connect
+        # thread ident -> (thread, connection)
+        self._connections = {}
+        self._lock = threading.Condition()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+        self.reclaimed = 0
+        self.closed = 0
+
+    def _new_connection(self) -> sqlite3.Connection:
+        # connections are only used by the thread that owns them, but may be
+        # closed from another thread on shutdown or when reclaimed
+        conn = sqlite3.connect(
+            self.db,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        if self.on_connect:
+            self.on_connect(conn)
+        self.created += 1
+        logger.debug(
+            "Opened connection %s to %s for thread %s",
+            self.created,
+            self.db,
+            threading.current_thread().name,
+        )
+        return conn
+
+    def _reclaim_dead(self):
+        # must be called with the lock held
+        dead = [
+            ident
+            for ident, (thread, _) in self._connections.items()
+            if not thread.is_alive()
+        ]
+        for ident in dead:
+            _, conn = self._connections.pop(ident)
+            conn.close()
+            self.reclaimed += 1
+            self.closed += 1
+        return len(dead)
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Get the connection owned by the current thread, opening one if needed
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            if self._closed:
+                raise Error("Connection pool has been shut down")
+            entry = self._connections.get(ident)
+            if entry:
+                self.reused += 1
+                return entry[1]
+            deadline = time.monotonic() + self.timeout
+            while len(self._connections) >= self.max_size:
+                if self._reclaim_dead():
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"All {self.max_size} connections to {self.db} are in use"
+                    )
+                # threads do not notify when they die, so poll
+                self._lock.wait(min(remaining, 0.1))
+            conn = self._new_connection()
+            self._connections[ident] = (threading.current_thread(), conn)
+            return conn
+
+    def current(self):
+        """
+        The current thread's connection, None if it has none. Never opens or waits for one
+        """
+        with self._lock:
+            entry = self._connections.get(threading.get_ident())
+            return entry[1] if entry else None
+
+    def release(self):
+        """
+        Close the current thread's connection and free its slot
+        """
+        with self._lock:
+            entry = self._connections.pop(threading.get_ident(), None)
+            if entry:
+                entry[1].close()
+                self.closed += 1
+                self._lock.notify()
+
+    def close_all(self):
+        with self._lock:
+            for _, conn in self._connections.values():
+                conn.close()
+                self.closed += 1
+            self._connections.clear()
+            self._closed = True
+            self._lock.notify_all()
+        logger.info("Closed connection pool for %s: %s", self.db, self.stats())
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "open": len(self._connections),
+                "created": self.created,
+                "reused": self.reused,
+                "reclaimed": self.reclaimed,
+                "closed": self.closed,
+            }
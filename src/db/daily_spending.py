@@ -0,0 +1,216 @@
+"""
+    Spend of each category over any range of days, in constant time per category.
+    For every category, an int64 array holds the cumulative spend (and transaction count)
+    up to each day, so the spend from day a to day b is cumulative[b + 1] - cumulative[a].
+
+        spending = get_daily_spending()
+        spending.range_totals(day_num("2024-03-15"), day_num("2024-04-14"))
+
+    The days axis runs without gaps from the first to the last day with transactions.
+    Triggers log the amount each write adds to a (day, category) in DAILY_SPENDING_CHANGES,
+    and only those amounts are added to the sums: the axis is extended for days outside it,
+    and a new category or any change to CATEGORIES rebuilds the sums.
+    Like the spending cube, the sums are never modified once built, a sync makes new ones.
+"""
+
+import threading
+import logging
+import numpy as np
+from src.db.dbmanager import DBManager
+from src.db.spending_cube import category_axis
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+class DailySpending:
+    # sums used by the app, built on first use and synced after writes
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, categories, income, days, seq=0, version=None):
+        """
+        categories, income: CATEGORIES rows
+        days: (day number, category, total, count) of the transactions of each day and category
+        seq: last DAILY_SPENDING_CHANGES row the days include
+        """
+        days_categories = [day[1] for day in days]
+        self.categories, self.income = category_axis(
+            categories, income, days_categories
+        )
+        self.columns = {category: i for i, category in enumerate(self.categories)}
+        day_nums = np.array([day[0] for day in days], dtype=np.int64)
+        self.first_day = int(day_nums.min()) if len(days) else 0
+        length = int(day_nums.max()) - self.first_day + 1 if len(days) else 0
+        daily_totals = np.zeros((length, len(self.categories)), dtype=np.int64)
+        daily_counts = np.zeros((length, len(self.categories)), dtype=np.int64)
+        if len(days):
+            rows = day_nums - self.first_day
+            cols = np.array([self.columns[c] for c in days_categories], dtype=np.int64)
+            daily_totals[rows, cols] = [day[2] for day in days]
+            daily_counts[rows, cols] = [day[3] for day in days]
+        # row i: sum of the days before first_day + i
+        self.cumulative_totals = cumulative(daily_totals)
+        self.cumulative_counts = cumulative(daily_counts)
+        self.seq = seq
+        self.version = version
+
+    @classmethod
+    def load(cls, db: DBManager = None, version=None):
+        db = db or DBManager()
+        # a change a category gets after this is logged past seq, and rebuilds the sums
+        categories = db.select("SELECT CATEGORY, INCOME FROM CATEGORIES", [])
+        # changes are added to the sums, so seq must match the transactions exactly:
+        # both are read by a single statement, from the same snapshot
+        rows = db.select(
+            """
+                SELECT NULL, NULL, NULL, NULL, (
+                    SELECT seq FROM sqlite_sequence WHERE name = 'DAILY_SPENDING_CHANGES'
+                )
+                UNION ALL
+                SELECT DAY_NUM, CATEGORY, SUM(AMOUNT), COUNT(*), NULL
+                FROM TRANSACTIONS
+                GROUP BY DAY_NUM, CATEGORY
+            """,
+            [],
+        )
+        seq = rows[0][4] or 0
+        days = [row[:4] for row in rows[1:]]
+        return cls(
+            [row[0] for row in categories],
+            [row[1] for row in categories],
+            days,
+            seq=seq,
+            version=version,
+        )
+
+    @property
+    def last_day(self) -> int:
+        return self.first_day + len(self.cumulative_totals) - 2
+
+    def _rows(self, start_day: int, end_day: int):
+        # days outside the axis have no transactions
+        start = min(max(start_day - self.first_day, 0), len(self.cumulative_totals) - 1)
+        end = min(max(end_day + 1 - self.first_day, 0), len(self.cumulative_totals) - 1)
+        return start, max(end, start)
+
+    def range_totals(self, start_day: int, end_day: int) -> np.ndarray:
+        """
+        Spend of every category from start_day to end_day (day numbers, both included), in cents
+        """
+        start, end = self._rows(start_day, end_day)
+        return self.cumulative_totals[end] - self.cumulative_totals[start]
+
+    def range_counts(self, start_day: int, end_day: int) -> np.ndarray:
+        start, end = self._rows(start_day, end_day)
+        return self.cumulative_counts[end] - self.cumulative_counts[start]
+
+    def with_changes(self, changes, seq: int, version=None):
+        """
+        New sums with the (day number, category, amount, count) changes added,
+        or None if a change is for a category outside the axis and the sums have to be rebuilt
+        """
+        cols = np.array([self.columns.get(c[1], -1) for c in changes], dtype=np.int64)
+        if (cols < 0).any():
+            return None
+        day_nums = np.array([c[0] for c in changes], dtype=np.int64)
+        spending = object.__new__(DailySpending)
+        spending.__dict__.update(self.__dict__)
+        spending.seq = seq
+        spending.version = version
+        if not len(changes):
+            return spending
+        if len(self.cumulative_totals) == 1:
+            # no days yet, start the axis at the first change
+            spending.first_day = int(day_nums.min())
+        first_day = min(spending.first_day, int(day_nums.min()))
+        last_day = max(spending.last_day, int(day_nums.max()))
+        # days added before the axis repeat its first row (zeros),
+        # days added after it carry the last sums
+        pad = ((spending.first_day - first_day, last_day - spending.last_day), (0, 0))
+        totals = np.pad(self.cumulative_totals, pad, mode="edge")
+        counts = np.pad(self.cumulative_counts, pad, mode="edge")
+        # a change on a day moves the sums of that day and every later one
+        deltas = np.zeros((len(totals), len(self.categories)), dtype=np.int64)
+        count_deltas = np.zeros_like(deltas)
+        rows = day_nums - first_day + 1
+        amounts = np.array([c[2] for c in changes], dtype=np.int64)
+        np.add.at(deltas, (rows, cols), amounts)
+        np.add.at(count_deltas, (rows, cols), [c[3] for c in changes])
+        spending.first_day = first_day
+        spending.cumulative_totals = totals + deltas.cumsum(axis=0)
+        spending.cumulative_counts = counts + count_deltas.cumsum(axis=0)
+        return spending
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            version = DBManager.data_version()
+            if cls._shared is None:
+                cls._shared = cls.load(version=version)
+                logger.debug(
+                    "Built daily spending of %s days x %s categories",
+                    len(cls._shared.cumulative_totals) - 1,
+                    len(cls._shared.categories),
+                )
+            elif cls._shared.version != version:
+                cls._shared = sync(cls._shared, DBManager(), version)
+            return cls._shared
+
+    @classmethod
+    def shared_seq(cls):
+        with cls._shared_lock:
+            return None if cls._shared is None else cls._shared.seq
+
+
+def cumulative(daily: np.ndarray) -> np.ndarray:
+    """
+    Prefix sums of daily along the days, with a leading row of zeros
+    """
+    sums = np.zeros((len(daily) + 1, daily.shape[1]), dtype=np.int64)
+    np.cumsum(daily, axis=0, out=sums[1:])
+    return sums
+
+
+def get_head_seq(db: DBManager) -> int:
+    rows = db.select(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'DAILY_SPENDING_CHANGES'", []
+    )
+    return rows[0][0] if rows else 0
+
+
+def sync(spending: DailySpending, db: DBManager, version=None) -> DailySpending:
+    """
+    Sums up to date with the database, from the changes logged since spending.seq
+    """
+    seq = get_head_seq(db)
+    # changes past seq, committed since it was read, are applied by the next sync
+    changes = db.select(
+        """
+            SELECT DAY_NUM, CATEGORY, AMOUNT, COUNT
+            FROM DAILY_SPENDING_CHANGES
+            WHERE SEQ > ? AND SEQ <= ?
+        """,
+        [spending.seq, seq],
+    )
+    if any(change[0] is None for change in changes):
+        return DailySpending.load(db, version)
+    updated = spending.with_changes(changes, seq, version)
+    if updated is None:
+        return DailySpending.load(db, version)
+    if changes:
+        logger.debug("Daily spending: %s changes added", len(changes))
+    return updated
+
+
+def get_daily_spending() -> DailySpending:
+    """
+    The daily spending sums, synced with the writes committed since they were last used
+    """
+    return DailySpending.shared()
+
+
+def applied_seq():
+    """
+    Last DAILY_SPENDING_CHANGES row the sums have applied, None if they were not built
+    """
+    return DailySpending.shared_seq()
@@ -1,9 +1,17 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import calendar
 import logging
+import re
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-from src.db.dbmanager import DBManager
+from src.db.dbmanager import DBManager, from_cents
+from src.db.budget_index import get_budget_index
+from src.db.spending_cube import get_spending_cube
+from src.db.daily_spending import get_daily_spending
+from src.db.dates import month_from_key, day_num
+from src.db.queries import QUERIES
+from src.db.result_cache import cached
 from src.constants import TKINTER_BACKGROUND_COLOR
 
 
@@ -11,270 +19,337 @@ db = DBManager()
 logger = logging.getLogger("main").getChild(__name__)
 
 
-def get_end_of_month(month: str):
+TRANSACTIONS_COLUMNS = [
+    "id",
+    "date",
+    "description",
+    "amount",
+    "category",
+    "code",
+    "inferred category",
+    "filename",
+]
+# columns of an exported csv, same as the ones expected by the csv upload
+EXPORT_COLUMNS = {
+    "date": "Date",
+    "description": "Description",
+    "code": "Code",
+    "amount": "Amount",
+    "category": "Category",
+}
+
+
+TRANSACTIONS_PAGE_SIZE = 500
+TRANSACTIONS_PAGE_SQL = """
+    SELECT t.id, t.date, t.description, t.amount, t.category, t.code, t.inferred_category, f.filename
+    FROM transactions t LEFT OUTER JOIN files f ON t.file_id = f.id
+    {where}
+    ORDER BY t.date {sort}, t.id {sort}
+    LIMIT :limit
+"""
+# how each column of the listing is searched by get_transactions_page,
+# matches what is displayed in the transactions table
+TRANSACTIONS_FILTER_EXPRESSIONS = {
+    "date": "t.date",
+    "description": "t.description",
+    "amount": "CAST(t.amount / 100.0 AS TEXT)",
+    "category": "t.category",
+    "code": "t.code",
+    "inferred category": "CASE t.inferred_category WHEN 0 THEN 'No' ELSE 'Yes' END",
+    "filename": "COALESCE(f.filename, 'No file')",
+}
+# everything up to the last / or \\ of a path
+DIRECTORY_PATTERN = r"^.*[/\\]"
+# columns indexed by TRANSACTIONS_FTS
+FULL_TEXT_COLUMNS = ["description", "code"]
+# same word boundaries as the fts5 unicode61 tokenizer, which splits on underscores
+FULL_TEXT_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def to_categorical(values, rename=None):
     """
-    start_of_month: str in the format YYYY-MM
+    Categorical of values, with the categories sorted so it sorts like the values.
+    rename(index) is applied to the distinct values only,
+    and may map several of them to the same value
     """
-    month = datetime.strptime(month, "%Y-%m")
-    _, last_day = calendar.monthrange(month.year, month.month)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if rename is not None:
+        uniques = rename(pd.Index(uniques))
+    category_codes, categories = pd.factorize(uniques, sort=True)
+    return pd.Categorical.from_codes(category_codes[codes], categories=categories)
 
-    # Calculate the end of the month datetime
-    end_of_month = month + timedelta(days=last_day - 1)
-    return end_of_month.strftime("%Y-%m-%d")
 
+def get_file_names(paths):
+    names = paths.fillna("").str.replace(DIRECTORY_PATTERN, "", regex=True)
+    return names.where(names != "", "No file")
 
-def get_transactions_df(cols=None):
-    transactions = db.select(
-        """
-        SELECT t.id, t.date, t.description, t.amount, t.category, t.code, t.inferred_category, f.filename
-        FROM transactions t LEFT OUTER JOIN files f ON t.file_id = f.id
-        ORDER BY t.date DESC
-        """,
-        [],
-    )
-    df = pd.DataFrame(
-        transactions,
-        columns=[
-            "id",
-            "date",
-            "description",
-            "amount",
-            "category",
-            "code",
-            "inferred category",
-            "filename",
-        ],
-    )
+
+def transactions_rows_to_df(transactions, cols=None):
+    # object columns: inferring the string dtype of every value costs more than the rest
+    df = pd.DataFrame(transactions, columns=TRANSACTIONS_COLUMNS, dtype=object)
     # df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
-    df["amount"] = df["amount"].apply(lambda x: round(float(x), 2))
-    df["inferred category"] = df["inferred category"].apply(
-        lambda x: "No" if x == 0 else "Yes"
-    )
-    df["filename"] = df["filename"].apply(
-        lambda x: x.split("/")[-1].split("\\")[-1] if x else "No file"
+    df["id"] = df["id"].astype("int64")
+    df["amount"] = from_cents(df["amount"].astype("int64"))
+    # columns with few distinct values are categoricals: one small int per row
+    df["category"] = to_categorical(df["category"])
+    df["inferred category"] = pd.Categorical.from_codes(
+        (df["inferred category"] != 0).astype("int8"), categories=["No", "Yes"]
     )
+    # every transaction of a file repeats its path, only the distinct paths are parsed
+    df["filename"] = to_categorical(df["filename"], get_file_names)
     if cols:
         df = df[cols]
     return df
 
 
-def get_transactions_totals_df():
-    totals = db.select(
-        """
-            SELECT SUM(AMOUNT) AS TOTAL, INCOME
-            FROM TRANSACTIONS join CATEGORIES on TRANSACTIONS.CATEGORY = CATEGORIES.CATEGORY
-            GROUP BY INCOME
-        """,
-        [],
-    )
-    df = pd.DataFrame(totals, columns=["total", "income"])
-    # make sure there is a row for income = 0 and income = 1
-    if len(df) == 0:
-        df.loc[len(df.index)] = [0, 0]
-        df.loc[len(df.index)] = [0, 1]
-    elif len(df) == 1:
-        if df.iloc[0]["income"] == 0:
-            df.loc[len(df.index)] = [0, 1]
+@cached
+def get_transactions_df(cols=None):
+    transactions = db.select(QUERIES.get("transactions"), [])
+    return transactions_rows_to_df(transactions, cols)
+
+
+def to_full_text_query(search_str, columns=None):
+    """
+    fts5 query matching rows that contain a word starting with each word of search_str.
+    Every token is quoted, so user input can not inject fts5 operators.
+    Returns None if search_str has no words
+    """
+    tokens = FULL_TEXT_TOKEN_PATTERN.findall(search_str)
+    if not tokens:
+        return None
+    query = " AND ".join(f'"{token}"*' for token in tokens)
+    if columns:
+        query = "{" + " ".join(columns) + "} : (" + query + ")"
+    return query
+
+
+@cached
+def get_transactions_page(
+    after=None, limit=TRANSACTIONS_PAGE_SIZE, filters=None, sort="desc", cols=None
+):
+    """
+    One page of the transactions listing, ordered by (date, id).
+    Keyset pagination: the page starts right after the (date, id) cursor `after`,
+    so every page costs the same however deep into the history it is.
+    filters maps a listing column to a search string, description and code use the full text index.
+    Returns (df, cursor), cursor is None once there are no more pages
+    """
+    if sort not in ("asc", "desc"):
+        raise ValueError(f"Invalid sort: {sort}")
+    conditions = []
+    params = {"limit": limit}
+    for i, (col, search_str) in enumerate((filters or {}).items()):
+        if col not in TRANSACTIONS_FILTER_EXPRESSIONS:
+            raise ValueError(f"Can not filter transactions by {col}")
+        param = f"filter_{i}"
+        query = None
+        if col in FULL_TEXT_COLUMNS:
+            query = to_full_text_query(search_str, [col])
+        if query is not None:
+            conditions.append(
+                "t.id IN (SELECT rowid FROM transactions_fts "
+                f"WHERE transactions_fts MATCH :{param})"
+            )
+            params[param] = query
         else:
-            df.loc[len(df.index)] = [0, 0]  # income = 0
-    return df
+            expression = TRANSACTIONS_FILTER_EXPRESSIONS[col]
+            conditions.append(f"instr(lower({expression}), lower(:{param})) > 0")
+            params[param] = str(search_str)
+    if after is not None:
+        # row value comparison, a range scan of IDX_TRANSACTIONS_DATE_ID
+        operator = "<" if sort == "desc" else ">"
+        conditions.append(f"(t.date, t.id) {operator} (:after_date, :after_id)")
+        params["after_date"], params["after_id"] = after
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    transactions = db.select(
+        TRANSACTIONS_PAGE_SQL.format(where=where, sort=sort.upper()), params
+    )
+    cursor = None
+    if len(transactions) == limit:
+        last = transactions[-1]
+        cursor = (last[1], last[0])
+    return transactions_rows_to_df(transactions, cols), cursor
 
 
-def get_budget_summary_df(month, cols=None):
+def get_transactions_pages(
+    limit=TRANSACTIONS_PAGE_SIZE, filters=None, sort="desc", cols=None
+):
     """
-    month: str in the format YYYY-MM
+    Walk the whole listing with get_transactions_page, yielding one DataFrame per page
     """
-    start_date = datetime.strptime(month, "%Y-%m").strftime("%Y-%m-01")
-    end_date = get_end_of_month(month)
-    df = db.select(
-        f"""
-            -- Give budget since date for each expense category
-            WITH BUDGETSINCEDATE AS (
-                SELECT c.CATEGORY, COALESCE(b.amount, 0) AS AMOUNT
-                FROM CATEGORIES c
-                LEFT OUTER JOIN Budgets b ON b.category = c.category
-                WHERE c.INCOME = 0 AND (
-                    b.start_date IS NULL
-                    OR b.start_date = (
-                        SELECT MAX(b2.start_date)
-                        FROM Budgets b2
-                        WHERE b2.start_date <= '{start_date}'
-                        AND b2.category = c.category
+    cursor = None
+    while True:
+        # not cached, a walk over every page would evict everything else
+        df, cursor = get_transactions_page.__wrapped__(
+            cursor, limit, filters, sort, cols
+        )
+        if len(df):
+            yield df
+        if cursor is None:
+            return
+
+
+def export_transactions_csv(filename, page_size=TRANSACTIONS_PAGE_SIZE):
+    """
+    Write all transactions to a csv that can be uploaded again.
+    Walks the listing page by page, so memory does not grow with the history
+    and no read stays open while the file is written.
+    Returns the number of exported transactions
+    """
+    exported = 0
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        for df in get_transactions_pages(page_size, cols=list(EXPORT_COLUMNS)):
+            df.rename(columns=EXPORT_COLUMNS).to_csv(f, header=exported == 0, index=False)
+            exported += len(df)
+        if exported == 0:
+            f.write(",".join(EXPORT_COLUMNS.values()) + "\n")
+    logger.info("Exported %s transactions to %s", exported, filename)
+    return exported
+
+
+class Totals:
+    """
+    Totals over all transactions, reductions of the spending cube.
+    totals_df: same as get_transactions_totals_df()
+    spend_per_category_df: same as get_spend_per_category_df()
+    monthly_income_df: same as get_monthly_income_df()
+    income_vs_expenses_df: same as get_income_vs_expenses_df()
+    """
+
+    def __init__(self, cube):
+        income_cols = cube.income == 1
+        expense_cols = cube.income == 0
+        category_totals = cube.totals.sum(axis=0)
+        # a row for income = 0 and income = 1, even without transactions
+        self.totals_df = pd.DataFrame(
+            {
+                "total": from_cents(
+                    np.array(
+                        [
+                            category_totals[expense_cols].sum(),
+                            category_totals[income_cols].sum(),
+                        ]
                     )
-                )
-            ),
+                ),
+                "income": [0, 1],
+            }
+        )
+        spent = expense_cols & cube.counts.any(axis=0)
+        self.spend_per_category_df = pd.DataFrame(
+            {
+                "category": cube.categories[spent],
+                "total": from_cents(category_totals[spent]),
+            }
+        )
+        rows, cols = np.nonzero((cube.counts > 0) & income_cols)
+        self.monthly_income_df = pd.DataFrame(
+            {
+                "month": cube.months[rows],
+                "total": from_cents(cube.totals[rows, cols]),
+                "category": cube.categories[cols],
+            }
+        )
+        # categories that are not in CATEGORIES count as neither
+        months = cube.active_months()
+        self.income_vs_expenses_df = pd.DataFrame(
+            {
+                "month": cube.months[months],
+                "income": from_cents(cube.totals[months][:, income_cols].sum(axis=1)),
+                "expenses": from_cents(
+                    cube.totals[months][:, expense_cols].sum(axis=1)
+                ),
+            }
+        )
 
-            TRANSACTIONSBUDGET AS (
-                SELECT b.CATEGORY AS Category, b.AMOUNT AS Budget,
-                    COALESCE(SUM(t.amount),0) AS Actual, b.AMOUNT - COALESCE(SUM(t.amount),0) AS Remaining
-                FROM BUDGETSINCEDATE b
-                LEFT OUTER JOIN TRANSACTIONS t ON (
-                    t.category = b.category AND
-                    t.date >= '{start_date}' AND
-                    t.date <= '{end_date}'
-                )
-                GROUP BY b.CATEGORY
-                ORDER BY Remaining ASC
-            )
 
-            SELECT Category, Budget, ROUND(Actual, 2) AS Actual, ROUND(Remaining, 2) AS Remaining
-            FROM TRANSACTIONSBUDGET
-            WHERE Actual > 0 OR budget > 0
-            ;
-        """,
-        [],
+def get_totals():
+    return Totals(get_spending_cube())
+
+
+def get_transactions_totals_df():
+    return get_totals().totals_df
+
+
+def to_budget_summary(categories, budgets, actuals):
+    """
+    Budget summary of parallel arrays of categories, budgets and spend (cents):
+    categories with a budget or spend, the most overspent first
+    """
+    categories, budgets, actuals = (
+        np.asarray(categories, dtype=object),
+        np.asarray(budgets, dtype=np.int64),
+        np.asarray(actuals, dtype=np.int64),
+    )
+    keep = np.flatnonzero((actuals > 0) | (budgets > 0))
+    remaining = budgets[keep] - actuals[keep]
+    rows = keep[np.argsort(remaining, kind="stable")]
+    return pd.DataFrame(
+        {
+            "Category": categories[rows],
+            "Budget": from_cents(budgets[rows]),
+            "Actual": from_cents(actuals[rows]),
+            "Remaining": from_cents(budgets[rows] - actuals[rows]),
+        }
     )
-    df = pd.DataFrame(df, columns=cols or ["Category", "Budget", "Actual", "Remaining"])
+
+
+@cached
+def get_budget_summary_df(month, cols=None):
+    """
+    month: str in the format YYYY-MM
+    """
+    cube = get_spending_cube()
+    expense_cols = cube.income == 0
+    categories = cube.categories[expense_cols]
+    budgets = get_budget_index().lookup_many(categories, month)
+    df = to_budget_summary(categories, budgets, cube.month_totals(month)[expense_cols])
+    if cols:
+        df.columns = cols
     return df
 
 
-def get_budget_history_df(cols=None, category=None):
-    dates = db.select(
-        """
-        SELECT DISTINCT START_DATE AS Month
-        FROM Budgets
-        """,
-        [],
+@cached
+def get_budget_history_matrix():
+    """
+    Budget of every category for every month a budget starts, as a dense
+    month x category DataFrame (index: "YYYY-MM" start dates, sorted).
+    A budget carries forward until the category gets a new one, and is 0 before its first one
+    """
+    index = get_budget_index()
+    months = np.unique(index.start_keys)
+    # every category at every month a budget starts, in one vectorized lookup
+    amounts = index.lookup_many(index.categories[np.newaxis, :], months[:, np.newaxis])
+    return pd.DataFrame(
+        from_cents(amounts),
+        index=pd.Index([month_from_key(key) for key in months], name="start_date"),
+        columns=pd.Index(list(index.categories), name="category"),
     )
 
-    budgets = db.select(
-        """
-        SELECT b.CATEGORY, b.AMOUNT, b.START_DATE
-        FROM Budgets b
-        """,
-        [],
-    )
-    logger.debug("get_budget_history_df: dates: %s", dates)
-    dates_df = pd.DataFrame(dates, columns=["month"])
-    budgets_df = pd.DataFrame(budgets, columns=["category", "amount", "start_date"])
-    # convert to datetime
-    budgets_df["start_date"] = pd.to_datetime(budgets_df["start_date"], format="%Y-%m")
-    # for each date, get the budget for each category
-    # if there is no budget for that category, get the budget from the previous month where there is a budget for that category
-    # if there is no budget for that category in the previous month, set the budget to 0
-    for month in dates_df["month"]:
-        # convert to datetime
-        month = datetime.strptime(month, "%Y-%m")
-        for category in budgets_df["category"].unique():
-            budget = budgets_df[
-                (budgets_df["category"] == category)
-                & (budgets_df["start_date"] == month)
-            ]
-            if not budget.empty:
-                logging.debug(
-                    "get_budget_history_df: found existing budget for %s in %s: %s",
-                    category,
-                    month,
-                    budget.iloc[0]["amount"],
-                )
-                continue
-
-            logger.debug(
-                "get_budget_history_df: no budget for %s in %s", category, month
-            )
-            # create a new row for this category and month
-            # get the amount from a previous budget. If it exists, use that. Otherwise, use 0
-            prev_budget = budgets_df[
-                (budgets_df["category"] == category)
-                & (budgets_df["start_date"] < month)
-            ]
-            # select the budget with the max start_date
-            prev_budget = prev_budget[
-                prev_budget["start_date"] == prev_budget["start_date"].max()
-            ]
-            if prev_budget.empty:
-                logger.debug(
-                    "get_budget_history_df: no previous budget for %s before %s. Setting it to 0",
-                    category,
-                    month,
-                )
-                budgets_df.loc[len(budgets_df.index)] = [
-                    category,
-                    0,  # amount
-                    month,
-                ]
-            else:
-                prev_budget = prev_budget.iloc[0]
-                logger.debug(
-                    "get_budget_history_df: previous budget for %s before %s: %s",
-                    category,
-                    month,
-                    prev_budget["amount"],
-                )
-                budgets_df.loc[len(budgets_df.index)] = [
-                    category,
-                    prev_budget["amount"],
-                    month,
-                ]
-    # sort by category and start_date
-    budgets_df.sort_values(["category", "start_date"], inplace=True)
-    # convert start_date back to string
-    budgets_df["start_date"] = budgets_df["start_date"].apply(
-        lambda x: x.strftime("%Y-%m")
-    )
-    logger.debug("get_budget_history_df: Result: ")
-    logger.debug(budgets_df)
-
-    # assert that number of rows is equal to number of dates * number of categories
-    if not len(budgets_df.index) == len(dates_df.index) * len(
-        budgets_df["category"].unique()
-    ):
-        logger.error(
-            "get_budget_history_df: number of rows in budgets_df (%s) does not equal number of dates (%s) * number of categories (%s)",
-            len(budgets_df.index),
-            len(dates_df.index),
-            len(budgets_df["category"].unique()),
-        )
-    return budgets_df
+
+@cached
+def get_budget_history_df(cols=None, category=None):
+    """
+    get_budget_history_matrix in long form: one (category, amount, start_date) row
+    per category and month a budget starts, sorted by category and start_date
+    """
+    matrix = get_budget_history_matrix()
+    budgets_df = matrix.melt(value_name="amount", ignore_index=False).reset_index()
+    budgets_df = budgets_df[["category", "amount", "start_date"]]
+    return budgets_df.sort_values(["category", "start_date"]).reset_index(drop=True)
 
 
 def get_monthly_income_df(cols=None):
-    df = db.select(
-        """
-            SELECT strftime('%Y-%m', date) AS month, SUM(amount) AS total, c.category
-            FROM Transactions t JOIN Categories c ON t.category = c.category
-            WHERE c.income = 1
-            GROUP BY month, c.category
-            ORDER BY month
-        """,
-        [],
-    )
-    df = pd.DataFrame(df, columns=cols or ["month", "total", "category"])
+    df = get_totals().monthly_income_df
+    if cols:
+        df.columns = cols
     return df
 
 
 def get_income_vs_expenses_df():
-    df = db.select(
-        """
-            WITH DATES AS (
-                SELECT DISTINCT strftime('%Y-%m', date) AS month
-                FROM TRANSACTIONS
-            ),
-            INCOME AS (
-                SELECT strftime('%Y-%m', date) AS month, SUM(amount) AS income
-                FROM TRANSACTIONS t JOIN CATEGORIES c ON t.CATEGORY = c.CATEGORY
-                WHERE c.INCOME = 1
-                GROUP BY month
-            ),
-            EXPENSES AS (
-                SELECT strftime('%Y-%m', date) AS month, SUM(amount) AS expenses
-                FROM TRANSACTIONS t JOIN CATEGORIES c ON t.CATEGORY = c.CATEGORY
-                WHERE c.INCOME = 0
-                GROUP BY month
-            )
-            SELECT d.month, COALESCE(i.income, 0) AS income, COALESCE(e.expenses, 0) AS expenses
-            FROM DATES d
-            LEFT JOIN INCOME i ON d.month = i.month
-            LEFT JOIN EXPENSES e ON d.month = e.month
-            ORDER BY d.month ASC
-            ;
-        """,
-        [],
-    )
-    df = pd.DataFrame(df, columns=["month", "income", "expenses"])
-    return df
+    return get_totals().income_vs_expenses_df
 
 
+@cached
 def get_budgets_df(cols=None):
     df = db.select(
         """
@@ -284,10 +359,14 @@ def get_budgets_df(cols=None):
         """,
         [],
     )
-    df = pd.DataFrame(df, columns=cols or ["id", "category", "amount", "start_date"])
+    df = pd.DataFrame(df, columns=["id", "category", "amount", "start_date"])
+    df["amount"] = from_cents(df["amount"])
+    if cols:
+        df.columns = cols
     return df
 
 
+@cached
 def get_files_df(cols=None):
     df = db.select(
         """
@@ -303,6 +382,7 @@ def get_files_df(cols=None):
     return df
 
 
+@cached
 def get_categories_df(cols=None):
     df = db.select(
         """
@@ -316,8 +396,231 @@ def get_categories_df(cols=None):
     return df
 
 
-def get_budget_vs_spend_plt(month):
-    df = get_budget_summary_df(month)
+class MonthReport:
+    """
+    Data of the Home page for a month, loaded once and shared by the table and charts.
+    summary_df: same as get_budget_summary_df(month)
+    spend_per_category_df: same as get_spend_per_category_df(month)
+    """
+
+    def __init__(self, month, summary_df, spend_per_category_df):
+        self.month = month
+        self.summary_df = summary_df
+        self.spend_per_category_df = spend_per_category_df
+
+
+def get_month_report(month):
+    return MonthReport(
+        month, get_budget_summary_df(month), get_spend_per_category_df(month)
+    )
+
+
+def get_month_reports():
+    """
+    MonthReport of every month with transactions, by month, from the spending cube
+    """
+    cube = get_spending_cube()
+    expense_cols = cube.income == 0
+    categories = cube.categories[expense_cols]
+    months = cube.active_months()
+    totals = cube.totals[months][:, expense_cols]
+    counts = cube.counts[months][:, expense_cols]
+    # budgets of every expense category in every month, in one lookup
+    budgets = get_budget_index().lookup_many(
+        categories[np.newaxis, :], cube.month_keys[months][:, np.newaxis]
+    )
+    reports = {}
+    for i, month in enumerate(cube.months[months]):
+        spent = counts[i] > 0
+        reports[month] = MonthReport(
+            month,
+            to_budget_summary(categories, budgets[i], totals[i]),
+            pd.DataFrame(
+                {
+                    "category": categories[spent],
+                    "total": from_cents(totals[i][spent]),
+                }
+            ),
+        )
+    return reports
+
+
+def get_prorated_budgets(categories, start_day, end_day):
+    """
+    Budget in cents of each category for the days start_day to end_day (day numbers):
+    each month's budget, in proportion to the days of the month in the range
+    """
+    days = np.arange(start_day, end_day + 1).astype("datetime64[D]")
+    months, days_in_range = np.unique(days.astype("datetime64[M]"), return_counts=True)
+    month_lengths = ((months + 1).astype("datetime64[D]") - months).astype(np.int64)
+    # months since 1970-01 to month keys YYYYMM
+    ordinals = months.astype(np.int64)
+    keys = (ordinals // 12 + 1970) * 100 + ordinals % 12 + 1
+    budgets = get_budget_index().lookup_many(
+        np.asarray(categories, dtype=object)[np.newaxis, :], keys[:, np.newaxis]
+    )
+    shares = days_in_range / month_lengths
+    return np.round(shares @ budgets).astype(np.int64)
+
+
+def get_range_report(start, end):
+    """
+    MonthReport of the days start to end (YYYY-MM-DD, both included).
+    Spend comes from the daily spending sums, budgets are prorated by get_prorated_budgets
+    """
+    start_day, end_day = day_num(start), day_num(end)
+    spending = get_daily_spending()
+    expense_cols = spending.income == 0
+    categories = spending.categories[expense_cols]
+    totals = spending.range_totals(start_day, end_day)[expense_cols]
+    spent = spending.range_counts(start_day, end_day)[expense_cols] > 0
+    budgets = get_prorated_budgets(categories, start_day, end_day)
+    return MonthReport(
+        f"{start} to {end}",
+        to_budget_summary(categories, budgets, totals),
+        pd.DataFrame(
+            {"category": categories[spent], "total": from_cents(totals[spent])}
+        ),
+    )
+
+
+class YearSummary:
+    """
+    Spend and budgets of a year, month by month.
+    months: the 12 YYYY-MM labels
+    categories: expense categories with spend or a budget during the year
+    spend, budgets: cents, months x categories
+    income, expenses: cents per month, over all categories
+    """
+
+    def __init__(self, year, months, categories, spend, budgets, income, expenses):
+        self.year = year
+        self.months = months
+        self.categories = categories
+        self.spend = spend
+        self.budgets = budgets
+        self.income = income
+        self.expenses = expenses
+
+
+def get_year_summary(year):
+    """
+    YearSummary of year: twelve rows of the spending cube, and the budget of every
+    category in every month in one lookup
+    """
+    cube = get_spending_cube()
+    month_keys = year * 100 + np.arange(1, 13)
+    months = np.array([month_from_key(key) for key in month_keys])
+    # months the cube has no row for have no transactions
+    totals = np.zeros((12, len(cube.categories)), dtype=np.int64)
+    for i, month in enumerate(months):
+        totals[i] = cube.month_totals(month)
+    expense_cols = cube.income == 0
+    categories = cube.categories[expense_cols]
+    spend = totals[:, expense_cols]
+    budgets = get_budget_index().lookup_many(
+        categories[np.newaxis, :], month_keys[:, np.newaxis]
+    )
+    active = (spend != 0).any(axis=0) | (budgets > 0).any(axis=0)
+    return YearSummary(
+        year,
+        months,
+        categories[active],
+        spend[:, active],
+        budgets[:, active],
+        totals[:, cube.income == 1].sum(axis=1),
+        spend.sum(axis=1),
+    )
+
+
+def get_year_at_a_glance_plt(year, summary=None):
+    """
+    Single figure of a year: spend of each category in each month, colored by how much
+    of the month's budget it used, with the yearly totals of each category and month.
+    summary: result of get_year_summary(year), loaded if not given
+    """
+    if summary is None:
+        summary = get_year_summary(year)
+    spend = from_cents(summary.spend.T)
+    budgets = from_cents(summary.budgets.T)
+    fig = plt.figure(figsize=(14, max(6, 0.35 * len(summary.categories) + 4)))
+    fig.patch.set_facecolor(TKINTER_BACKGROUND_COLOR)
+    grid = fig.add_gridspec(2, 2, width_ratios=[4, 1], height_ratios=[3, 1])
+    heatmap_ax = fig.add_subplot(grid[0, 0])
+    categories_ax = fig.add_subplot(grid[0, 1], sharey=heatmap_ax)
+    months_ax = fig.add_subplot(grid[1, 0])
+    totals_ax = fig.add_subplot(grid[1, 1])
+    for ax in (heatmap_ax, categories_ax, months_ax, totals_ax):
+        ax.set_facecolor(TKINTER_BACKGROUND_COLOR)
+    month_labels = [calendar.month_abbr[i] for i in range(1, 13)]
+
+    if len(summary.categories):
+        # share of the budget spent, categories without a budget count as fully spent
+        with np.errstate(divide="ignore", invalid="ignore"):
+            used = np.where(
+                budgets > 0, spend / budgets, np.where(spend > 0, 1.0, 0.0)
+            )
+        image = heatmap_ax.imshow(
+            np.clip(used, 0, 2), cmap="RdYlGn_r", vmin=0, vmax=2, aspect="auto"
+        )
+        fig.colorbar(image, ax=heatmap_ax, fraction=0.03, pad=0.01)
+    else:
+        heatmap_ax.text(
+            0.5,
+            0.5,
+            "No spending or budgets",
+            ha="center",
+            transform=heatmap_ax.transAxes,
+        )
+    for (row, col), amount in np.ndenumerate(spend):
+        if amount:
+            heatmap_ax.text(
+                col, row, f"{amount:.0f}", ha="center", va="center", fontsize=7
+            )
+    heatmap_ax.set_xticks(range(12))
+    heatmap_ax.set_xticklabels(month_labels)
+    heatmap_ax.set_yticks(range(len(summary.categories)))
+    heatmap_ax.set_yticklabels(summary.categories)
+    heatmap_ax.set_title(f"Spend per category in {year} (color: share of budget)")
+
+    y = np.arange(len(summary.categories))
+    categories_ax.barh(y - 0.2, budgets.sum(axis=1), height=0.4, label="Budget")
+    categories_ax.barh(y + 0.2, spend.sum(axis=1), height=0.4, label="Actual")
+    categories_ax.tick_params(axis="y", labelleft=False)
+    categories_ax.set_title("Year total")
+    categories_ax.legend(fontsize=7)
+
+    x = np.arange(12)
+    income = from_cents(summary.income)
+    expenses = from_cents(summary.expenses)
+    months_ax.bar(x - 0.2, income, width=0.4, color="green", label="Income")
+    months_ax.bar(x + 0.2, expenses, width=0.4, color="red", label="Expenses")
+    months_ax.set_xticks(x)
+    months_ax.set_xticklabels(month_labels)
+    months_ax.set_ylabel("Amount")
+    months_ax.legend(fontsize=7)
+
+    totals_ax.axis("off")
+    totals_ax.text(
+        0,
+        0.5,
+        f"Income: {income.sum():.2f}\n"
+        f"Expenses: {expenses.sum():.2f}\n"
+        f"Net: {income.sum() - expenses.sum():.2f}\n"
+        f"Budget: {budgets.sum():.2f}",
+        va="center",
+        fontsize=11,
+    )
+    fig.tight_layout()
+    return fig
+
+
+def get_budget_vs_spend_plt(month, df=None):
+    """
+    df: result of get_budget_summary_df(month), loaded if not given
+    """
+    if df is None:
+        df = get_budget_summary_df(month)
 
     fig, ax = plt.subplots()  # Adjust the figure size as needed
     fig.patch.set_facecolor(TKINTER_BACKGROUND_COLOR)
@@ -345,32 +648,27 @@ def get_budget_vs_spend_plt(month):
     return fig
 
 
-def get_spend_per_category_pie_chart_plt(month=None):
-    if month:
-        # Pie chart of spend per category
-        start_date = datetime.strptime(month, "%Y-%m").strftime("%Y-%m-01")
-        end_date = get_end_of_month(month)
-        transactions_for_month = db.select(
-            f"""
-                SELECT c.category, SUM(t.amount) AS total
-                FROM Transactions t JOIN Categories c ON t.category = c.category
-                WHERE t.date >= '{start_date}' AND t.date <= '{end_date}'
-                AND c.income = 0
-                GROUP BY c.category
-            """,
-            [],
-        )
-    else:
-        transactions_for_month = db.select(
-            """
-                SELECT c.category, SUM(t.amount) AS total
-                FROM Transactions t JOIN Categories c ON t.category = c.category
-                WHERE c.income = 0
-                GROUP BY c.category
-            """,
-            [],
-        )
-    df = pd.DataFrame(transactions_for_month, columns=["category", "total"])
+@cached
+def get_spend_per_category_df(month=None):
+    if not month:
+        return get_totals().spend_per_category_df
+    # Pie chart of spend per category
+    cube = get_spending_cube()
+    spent = (cube.income == 0) & (cube.month_counts(month) > 0)
+    return pd.DataFrame(
+        {
+            "category": cube.categories[spent],
+            "total": from_cents(cube.month_totals(month)[spent]),
+        }
+    )
+
+
+def get_spend_per_category_pie_chart_plt(month=None, df=None):
+    """
+    df: result of get_spend_per_category_df(month), loaded if not given
+    """
+    if df is None:
+        df = get_spend_per_category_df(month)
     fig, ax = plt.subplots()  # Adjust the size as needed
     fig.patch.set_facecolor(TKINTER_BACKGROUND_COLOR)
     ax.set_facecolor(TKINTER_BACKGROUND_COLOR)
@@ -402,8 +700,12 @@ def get_spend_per_category_pie_chart_plt(month=None):
     return fig
 
 
-def get_budget_minus_spend_bar_chart_plt(month):
-    df = get_budget_summary_df(month)
+def get_budget_minus_spend_bar_chart_plt(month, df=None):
+    """
+    df: result of get_budget_summary_df(month), loaded if not given
+    """
+    if df is None:
+        df = get_budget_summary_df(month)
     fig, ax = plt.subplots()  # Adjust the figure size as needed
     fig.patch.set_facecolor(TKINTER_BACKGROUND_COLOR)
     ax.set_facecolor(TKINTER_BACKGROUND_COLOR)
@@ -431,27 +733,21 @@ def get_budget_minus_spend_bar_chart_plt(month):
 
 
 def get_budget_history_plt(category=None):
-    # DF SHOULD BE SORTED BY CATEGORY AND START_DATE!!
-    budget_history_df = get_budget_history_df()
+    budget_history = get_budget_history_matrix()
     fig, ax = plt.subplots()  # Adjust the figure size as needed
     fig.patch.set_facecolor(TKINTER_BACKGROUND_COLOR)
     ax.set_facecolor(TKINTER_BACKGROUND_COLOR)
 
-    dates = budget_history_df["start_date"].unique()
-    # convert the dates to datetime objects
-    dates = [datetime.strptime(date, "%Y-%m") for date in dates]
-    # sort the dates from earliest to latest
-    dates.sort()
+    # rows are already sorted from earliest to latest
+    dates = pd.to_datetime(budget_history.index, format="%Y-%m")
 
     # plot the amount over time for each category
     # label each line with its category
     # show points on the line
-    # extend each line on both sides to the edge of the plot. Stay constant after the last date
-    for category in budget_history_df["category"].unique():
-        category_df = budget_history_df[budget_history_df["category"] == category]
+    for category in budget_history.columns:
         ax.plot(
             dates,
-            category_df["amount"],
+            budget_history[category],
             label=category,
             marker="o",
         )
@@ -464,11 +760,12 @@ def get_budget_history_plt(category=None):
     return fig
 
 
-def get_income_vs_expenses_plt():
+def get_income_vs_expenses_plt(df=None):
     # plot a line for income and a line for expenses
     # show points on the line
     # show dates on the x-axis
-    df = get_income_vs_expenses_df()
+    if df is None:
+        df = get_income_vs_expenses_df()
     fig, ax = plt.subplots()  # Adjust the figure size as needed
     fig.patch.set_facecolor(TKINTER_BACKGROUND_COLOR)
     ax.set_facecolor(TKINTER_BACKGROUND_COLOR)
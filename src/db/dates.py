@@ -0,0 +1,46 @@
+"""
+    Integer date keys.
+    month key: YYYYMM, e.g. 202401 for 2024-01, used by the in-memory summaries
+    day number: days since 1970-01-01, stored with each transaction
+"""
+
+from datetime import date, datetime
+import numpy as np
+
+EPOCH = date(1970, 1, 1)
+
+
+def month_from_key(key: int) -> str:
+    return f"{key // 100:04d}-{key % 100:02d}"
+
+
+def day_num(day: str) -> int:
+    """
+    day: str in the format YYYY-MM-DD
+    """
+    return (datetime.strptime(day, "%Y-%m-%d").date() - EPOCH).days
+
+
+def day_from_num(num: int) -> str:
+    return str(np.datetime64(int(num), "D"))
+
+
+def day_nums(dates):
+    """
+    Vectorized day_num of a pandas Series of datetimes
+    """
+    return dates.values.astype("datetime64[D]").astype("int64")
+
+
+# place value of the digits of "YYYY-MM" in its month key YYYYMM
+MONTH_KEY_DIGITS = [0, 1, 2, 3, 5, 6]
+MONTH_KEY_WEIGHTS = np.array([100000, 10000, 1000, 100, 10, 1], dtype=np.int64)
+
+
+def str_month_keys(months) -> np.ndarray:
+    """
+    Month keys of "YYYY-MM" strings, longer dates are cut to their month
+    """
+    months = np.asarray(months, dtype="U7")
+    digits = months.reshape(-1).view("U1").reshape(-1, 7)[:, MONTH_KEY_DIGITS]
+    return (digits.astype(np.int64) @ MONTH_KEY_WEIGHTS).reshape(months.shape)
@@ -1,7 +1,17 @@
 import sqlite3
 import os
+import threading
+import time
 import logging
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
 from sqlite3 import Error
+import numpy as np
+from src.db.connection_pool import ConnectionPool
+from src.db import migrator
+from src.db.pragmas import load_pragma_profile, apply_pragmas, pragma_report
+from src.db.queries import QUERIES, StatementCacheStats
+from src.db.instrumentation import QueryInstrumentation
 
 
 def throws_db_error(func):
@@ -10,10 +20,12 @@ def throws_db_error(func):
             return func(*args, **kwargs)
         except Error as e:
             logger.error(e)
-            conn = args[0].conn
-            if conn:
-                args[0].conn.close()
-                args[0].conn = None
+            # discard any partial work, but keep the pooled connection open.
+            # Inside transaction(), the context manager decides what to undo.
+            # The error may come from the pool itself, so do not acquire a connection
+            conn = args[0].pool.current()
+            if conn and conn.in_transaction and not args[0].in_transaction():
+                conn.rollback()
             raise e
 
     return wrapper
@@ -21,75 +33,373 @@ def throws_db_error(func):
 
 logger = logging.getLogger("main").getChild(__name__)
 
+CENTS_PER_UNIT = 100
+# floats are rounded to this many digits of a cent first, which drops the binary
+# representation error: 1.005 is stored as 1.00499999..., but means 100.5 cents
+CENT_DIGITS = 6
+
+
+def to_cents(amount):
+    """
+    Convert an amount of money to integer cents, as stored in the database.
+    Accepts a number or numeric string, or a numpy array / pandas Series of floats.
+    Half cents are rounded away from zero (1.005 -> 101, -0.125 -> -13),
+    the same way for single values and arrays
+    """
+    if isinstance(amount, (int, float, str, Decimal)):
+        cents = Decimal(str(amount).replace(",", "")) * CENTS_PER_UNIT
+        return int(cents.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    cents = np.round(amount * CENTS_PER_UNIT, CENT_DIGITS)
+    return (np.sign(cents) * np.floor(np.abs(cents) + 0.5)).astype("int64")
+
+
+def from_cents(cents):
+    """
+    Convert integer cents from the database to an amount of money.
+    Works on a single value, a numpy array or a pandas Series
+    """
+    if cents is None:
+        return None
+    return cents / CENTS_PER_UNIT
+
 
 # class to handle database
 class DBManager:
     SCHEMA = "src/db/schema.sql"
+    # Tk thread, async data workers and the CSV import thread
+    DEFAULT_POOL_SIZE = 6
+    # rows fetched at a time by select_chunks
+    DEFAULT_CHUNK_SIZE = 1000
+    # size of sqlite3's per connection prepared statement cache
+    CACHED_STATEMENTS = 256
+    statement_cache = StatementCacheStats(CACHED_STATEMENTS)
+    DEFAULT_SLOW_QUERY_MS = 100
+    instrumentation = QueryInstrumentation(DEFAULT_SLOW_QUERY_MS)
+    # one pool per database file, shared by every DBManager instance
+    _pools = {}
+    _pools_lock = threading.Lock()
+    # PRAGMA profile applied to each pool's connections
+    _pragma_profiles = {}
+    # database files already migrated by this process
+    _migrated = set()
+    # per thread transaction depth, keyed by database file
+    _tx_local = threading.local()
+    # bumped after every commit of a write, so cached results can tell they are stale
+    _data_version = 0
+    _data_version_lock = threading.Lock()
 
     def __init__(self):
         self.db = os.getenv("DB_FILE")
-        self.conn = None
         if not self.db:
             raise Exception("Database file not specified")
 
-        if not os.path.exists(self.db):
+        is_new = not os.path.exists(self.db)
+        self.pool, is_new_pool = DBManager._get_pool(self.db)
+        if is_new:
             logger.info("Database %s does not exist. Creating...", self.db)
             self.setup()
+        elif self.db not in DBManager._migrated:
+            self.migrate()
+        if is_new_pool:
+            logger.info("SQLite settings for %s: %s", self.db, self.pragma_report())
+
+    @classmethod
+    def _get_pool(cls, db) -> (ConnectionPool, bool):
+        with cls._pools_lock:
+            pool = cls._pools.get(db)
+            if pool is not None and not pool.is_closed:
+                return pool, False
+            size = int(os.getenv("DB_POOL_SIZE", str(cls.DEFAULT_POOL_SIZE)))
+            cls.instrumentation.slow_query_ms = float(
+                os.getenv("DB_SLOW_QUERY_MS", str(cls.DEFAULT_SLOW_QUERY_MS))
+            )
+            profile = load_pragma_profile()
+            pool = ConnectionPool(
+                db,
+                max_size=size,
+                on_connect=lambda conn: apply_pragmas(conn, profile),
+                cached_statements=cls.CACHED_STATEMENTS,
+            )
+            cls._pools[db] = pool
+            cls._pragma_profiles[db] = profile
+            return pool, True
+
+    @classmethod
+    def close_all(cls):
+        """
+        Close every pooled connection. Call on application shutdown
+        """
+        with cls._pools_lock:
+            for pool in cls._pools.values():
+                pool.close_all()
+            cls._pools.clear()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self.pool.acquire()
+
+    def release(self):
+        """
+        Give back the current thread's connection, e.g. when a worker thread is done
+        """
+        self.pool.release()
+
+    def pool_stats(self) -> dict:
+        return self.pool.stats()
+
+    def query_stats(self) -> dict:
+        """
+        Prepared statement cache hits/misses, and uses of each named query
+        """
+        return {
+            "statement_cache": DBManager.statement_cache.stats(),
+            "named_queries": QUERIES.stats(),
+        }
+
+    def dump_query_stats(self) -> str:
+        """
+        Report of latency per statement, statement cache and pool usage
+        """
+        return "\n".join(
+            [
+                DBManager.instrumentation.report(),
+                f"statement cache: {DBManager.statement_cache.stats()}",
+                f"pool: {self.pool_stats()}",
+            ]
+        )
+
+    def pragma_report(self) -> dict:
+        """
+        Settings actually in effect on this thread's connection
+        """
+        return pragma_report(self.conn, DBManager._pragma_profiles[self.db])
+
+    def _tx_depth(self) -> int:
+        depths = getattr(DBManager._tx_local, "depths", None)
+        if depths is None:
+            depths = DBManager._tx_local.depths = {}
+        return depths.get(self.db, 0)
+
+    def _set_tx_depth(self, depth: int):
+        self._tx_depth()  # make sure the dict exists for this thread
+        DBManager._tx_local.depths[self.db] = depth
+
+    def in_transaction(self) -> bool:
+        return self._tx_depth() > 0
+
+    @classmethod
+    def thread_in_transaction(cls) -> bool:
+        """
+        True if the current thread is inside transaction() on any database
+        """
+        depths = getattr(cls._tx_local, "depths", None) or {}
+        return any(depth > 0 for depth in depths.values())
+
+    @contextmanager
+    def transaction(self, write=True):
+        """
+        Group statements into a single commit:
 
-    def _connect(self):
+            with db.transaction():
+                db.insert(...)
+                db.update(...)
+
+        Everything is rolled back if the block raises.
+        Nested blocks use savepoints, so an inner failure only undoes the inner block.
+        A write transaction takes the write lock when it begins (BEGIN IMMEDIATE):
+        a block that reads, then writes, could otherwise fail with SQLITE_BUSY
+        if another connection commits in between. Pass write=False for a block
+        that only reads from a single snapshot
+        """
+        conn = self.conn
+        depth = self._tx_depth()
+        savepoint = f"sp_{depth}"
+        if depth == 0:
+            if conn.in_transaction:
+                # commit work left over by a statement outside of transaction()
+                conn.commit()
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        else:
+            conn.execute(f"SAVEPOINT {savepoint}")
+        self._set_tx_depth(depth + 1)
         try:
-            return sqlite3.connect(self.db)
+            yield self
+        except BaseException:
+            self._set_tx_depth(depth)
+            if depth == 0:
+                conn.rollback()
+            else:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            raise
+        self._set_tx_depth(depth)
+        if depth == 0:
+            conn.commit()
+            DBManager._bump_data_version()
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+
+    @classmethod
+    def data_version(cls) -> int:
+        """
+        Number of writes committed by this process
+        """
+        return cls._data_version
+
+    @classmethod
+    def _bump_data_version(cls):
+        with cls._data_version_lock:
+            cls._data_version += 1
+
+    @classmethod
+    def invalidate_cached_results(cls):
+        """
+        Make every result cached so far stale, for in-memory state that changed
+        without a commit
+        """
+        cls._bump_data_version()
+
+    def _commit(self, conn: sqlite3.Connection):
+        # inside transaction() the outermost block commits
+        if not self.in_transaction():
+            conn.commit()
+            DBManager._bump_data_version()
+
+    def _execute(self, conn: sqlite3.Connection, sql, data, many=False, fetch=False):
+        """
+        Run a statement, recording its latency and row count.
+        Returns the cursor and, if fetch is True, all rows
+        """
+        DBManager.statement_cache.record(conn, sql)
+        start = time.perf_counter()
+        c = conn.cursor()
+        if many:
+            c.executemany(sql, data)
+        else:
+            c.execute(sql, data)
+        rows = c.fetchall() if fetch else None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        row_count = len(rows) if fetch else c.rowcount
+        is_slow = DBManager.instrumentation.record(sql, elapsed_ms, row_count)
+        if is_slow:
+            plan = None if many else self._query_plan(conn, sql, data)
+            DBManager.instrumentation.log_slow_query(sql, elapsed_ms, row_count, plan)
+        return c, rows
+
+    def _query_plan(self, conn: sqlite3.Connection, sql, data) -> list[str]:
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", data).fetchall()
         except Error as e:
-            logger.error("Error connecting to database: %s", e)
-            return None
+            logger.debug("Could not get query plan: %s", e)
+            return []
+        # rows are (id, parent, notused, detail)
+        depths = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in plan:
+            depths[node_id] = depths.get(parent, 0) + 1
+            lines.append("  " * depths[node_id] + detail)
+        return lines
 
     def setup(self):
-        self.conn = self._connect()
         with open(DBManager.SCHEMA, "r", encoding="utf-8") as f:
             schema = f.read()
-            cur = self.conn.cursor()
+            conn = self.conn
+            cur = conn.cursor()
             cur.executescript(schema)
-            self.conn.commit()
+            conn.commit()
+        self.migrate()
+
+    def schema_version(self) -> int:
+        return migrator.get_version(self.conn)
+
+    def migrate(self) -> list[int]:
+        """
+        Upgrade the database in place to the latest schema version
+        """
+        with DBManager._pools_lock:
+            applied = migrator.migrate(self.conn)
+            DBManager._migrated.add(self.db)
+        return applied
+
+    def reset_schema_version(self):
+        """
+        Mark the database as freshly created from schema.sql. Used when dropping all tables
+        """
+        migrator.set_version(self.conn, 0)
+        DBManager._migrated.discard(self.db)
 
     @throws_db_error
     def create_table(self, create_table_sql):
-        self.conn = self._connect()
-        c = self.conn.cursor()
-        c.execute(create_table_sql)
+        self._execute(self.conn, create_table_sql, ())
 
     @throws_db_error
     def insert(self, sql, data):
-        self.conn = self._connect()
-        c = self.conn.cursor()
-        c.execute(sql, data)
-        self.conn.commit()
+        conn = self.conn
+        c, _ = self._execute(conn, sql, data)
+        self._commit(conn)
         return c.lastrowid
 
     @throws_db_error
     def insert_many(self, sql, data):
-        self.conn = self._connect()
-        c = self.conn.cursor()
-        c.executemany(sql, data)
-        self.conn.commit()
+        conn = self.conn
+        c, _ = self._execute(conn, sql, data, many=True)
+        self._commit(conn)
         return c.lastrowid
 
     @throws_db_error
     def select(self, sql, data):
-        self.conn = self._connect()
-        c = self.conn.cursor()
-        c.execute(sql, data)
-        return c.fetchall()
+        _, rows = self._execute(self.conn, sql, data, fetch=True)
+        return rows
+
+    def select_chunks(self, sql, data, chunk_size=None):
+        """
+        Yield the result in lists of at most chunk_size rows, so memory stays bounded.
+        The statement stays open until the generator is exhausted or closed
+        """
+        chunk_size = chunk_size or DBManager.DEFAULT_CHUNK_SIZE
+        conn = self.conn
+        DBManager.statement_cache.record(conn, sql)
+        # only time spent in sqlite is recorded, not time spent by the consumer
+        elapsed = 0.0
+        row_count = 0
+        c = conn.cursor()
+        try:
+            start = time.perf_counter()
+            c.execute(sql, data)
+            elapsed += time.perf_counter() - start
+            while True:
+                start = time.perf_counter()
+                rows = c.fetchmany(chunk_size)
+                elapsed += time.perf_counter() - start
+                if not rows:
+                    break
+                row_count += len(rows)
+                yield rows
+        except Error as e:
+            logger.error(e)
+            raise e
+        finally:
+            c.close()
+            elapsed_ms = elapsed * 1000
+            if DBManager.instrumentation.record(sql, elapsed_ms, row_count):
+                DBManager.instrumentation.log_slow_query(
+                    sql, elapsed_ms, row_count, self._query_plan(conn, sql, data)
+                )
 
     @throws_db_error
     def update(self, sql, data):
-        self.conn = self._connect()
-        c = self.conn.cursor()
-        c.execute(sql, data)
-        self.conn.commit()
+        conn = self.conn
+        self._execute(conn, sql, data)
+        self._commit(conn)
+
+    @throws_db_error
+    def update_many(self, sql, data):
+        conn = self.conn
+        self._execute(conn, sql, data, many=True)
+        self._commit(conn)
 
     @throws_db_error
     def delete(self, sql, data):
-        self.conn = self._connect()
-        c = self.conn.cursor()
-        c.execute(sql, data)
-        self.conn.commit()
+        conn = self.conn
+        self._execute(conn, sql, data)
+        self._commit(conn)
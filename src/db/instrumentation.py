@@ -0,0 +1,145 @@
+"""
+    Per statement latency tracking for DBManager.
+    Statements are grouped by fingerprint (the sql with literals and whitespace normalized).
+    Statements slower than the threshold are written to the slow query log with their query plan.
+"""
+
+import re
+import hashlib
+import threading
+import logging
+from bisect import bisect_left
+from collections import deque
+
+# upper bounds of the histogram buckets, in ms
+HISTOGRAM_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+COMMENT_PATTERN = re.compile(r"--[^\n]*")
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+logger = logging.getLogger("main").getChild(__name__)
+slow_query_logger = logger.getChild("slow_query")
+
+
+def normalize_sql(sql: str) -> str:
+    sql = COMMENT_PATTERN.sub(" ", sql)
+    sql = STRING_LITERAL_PATTERN.sub("?", sql)
+    sql = NUMBER_LITERAL_PATTERN.sub("?", sql)
+    return WHITESPACE_PATTERN.sub(" ", sql).strip()
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Short, stable id of a statement: a hash of the normalized sql
+    """
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:10]
+
+
+class StatementStats:
+    def __init__(self, sql: str, window: int):
+        self.sql = normalize_sql(sql)
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        # most recent durations, for the rolling histogram and percentiles
+        self.recent_ms = deque(maxlen=window)
+
+    def record(self, elapsed_ms: float, rows: int):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += max(rows, 0)
+        self.recent_ms.append(elapsed_ms)
+
+    def percentile(self, p: float) -> float:
+        recent = sorted(self.recent_ms)
+        if not recent:
+            return 0.0
+        return recent[min(int(len(recent) * p), len(recent) - 1)]
+
+    def histogram(self) -> list[int]:
+        # last bucket counts everything above the largest bound
+        counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for elapsed_ms in self.recent_ms:
+            counts[bisect_left(HISTOGRAM_BUCKETS_MS, elapsed_ms)] += 1
+        return counts
+
+    def as_dict(self) -> dict:
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0,
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "histogram": self.histogram(),
+        }
+
+
+class QueryInstrumentation:
+    def __init__(self, slow_query_ms: float = 100, window: int = 1000):
+        self.slow_query_ms = slow_query_ms
+        self.window = window
+        self.slow_queries = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, elapsed_ms: float, rows: int) -> bool:
+        """
+        Record one execution. Returns True if it was a slow query
+        """
+        key = fingerprint(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(sql, self.window)
+            stats.record(elapsed_ms, rows)
+            is_slow = elapsed_ms >= self.slow_query_ms
+            if is_slow:
+                self.slow_queries += 1
+        return is_slow
+
+    def log_slow_query(self, sql: str, elapsed_ms: float, rows: int, plan: list):
+        slow_query_logger.warning(
+            "Slow query %s took %.1fms and returned %s rows\n%s\nQuery plan:\n%s",
+            fingerprint(sql),
+            elapsed_ms,
+            rows,
+            normalize_sql(sql),
+            "\n".join(plan) if plan else "(not available)",
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self._stats.items()}
+
+    def report(self) -> str:
+        """
+        Human readable table of all statements, slowest total time first
+        """
+        stats = sorted(self.stats().items(), key=lambda item: -item[1]["total_ms"])
+        buckets = [f"<={bound}" for bound in HISTOGRAM_BUCKETS_MS] + [
+            f">{HISTOGRAM_BUCKETS_MS[-1]}"
+        ]
+        lines = [
+            f"{len(stats)} statements, {self.slow_queries} slow (>= {self.slow_query_ms}ms)",
+            f"histogram buckets (ms): {' '.join(buckets)}",
+        ]
+        for key, s in stats:
+            lines.append(
+                f"[{key}] calls={s['calls']} total={s['total_ms']}ms mean={s['mean_ms']}ms "
+                f"p50={s['p50_ms']}ms p95={s['p95_ms']}ms max={s['max_ms']}ms rows={s['rows']}"
+            )
+            lines.append(f"    histogram: {s['histogram']}")
+            lines.append(f"    {s['sql'][:200]}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.slow_queries = 0
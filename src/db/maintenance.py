@@ -0,0 +1,244 @@
+"""
+    Database maintenance while the app is idle, and on shutdown.
+    Refreshes the query planner statistics (ANALYZE, PRAGMA optimize), trims the
+    change logs of the in-memory summaries, and returns the pages freed by deletes
+    to the file system (incremental vacuum).
+    Work is split in small steps and run for at most a time budget at once,
+    on a worker thread, so the UI is never held.
+"""
+
+import os
+import time
+import logging
+from src.db.dbmanager import DBManager
+from src.db.pragmas import load_pragma_profile
+from src.db.async_data import loader, when_done
+from src.db import spending_cube, daily_spending
+
+# seconds without user input before maintenance starts
+IDLE_SECONDS = 60
+CHECK_INTERVAL_MS = 5000
+# time spent per batch of steps while idle, and on shutdown
+STEP_BUDGET_MS = 200
+SHUTDOWN_BUDGET_MS = 2000
+# hours between two complete runs
+DEFAULT_INTERVAL_HOURS = 24
+VACUUM_PAGES_PER_STEP = 128
+# rows sampled per index by ANALYZE, keeps each table's step short
+ANALYSIS_LIMIT = 1000
+AUTO_VACUUM_INCREMENTAL = 2
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+def get_file_size(db_file: str) -> int:
+    """
+    Size of the database, including its write ahead log
+    """
+    size = 0
+    for path in (db_file, db_file + "-wal"):
+        if os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+
+class Maintenance:
+    """
+    One complete maintenance run, executed a few steps at a time with run_for
+    """
+
+    def __init__(self, db: DBManager):
+        self.db = db
+        self.timings_ms = {}
+        self.size_before = None
+        self.done = False
+        self._steps = self.steps()
+
+    def _timed(self, task: str, sql: str):
+        start = time.perf_counter()
+        # select, so that pragmas returning rows are stepped to completion
+        self.db.select(sql, [])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.timings_ms[task] = self.timings_ms.get(task, 0) + elapsed_ms
+
+    def steps(self):
+        self.size_before = get_file_size(self.db.db)
+        self.prune_change_logs()
+        yield
+        tables = self.db.select(
+            """
+                SELECT name FROM sqlite_master
+                WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+                AND sql NOT LIKE 'CREATE VIRTUAL%'
+            """,
+            [],
+        )
+        for (table,) in tables:
+            # pragmas are per connection and each step may run on another worker
+            # thread, so the limit is set in the same step as the ANALYZE it bounds
+            self.db.select(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}", [])
+            self._timed("analyze", f'ANALYZE "{table}"')
+            yield
+        auto_vacuum = self.db.select("PRAGMA auto_vacuum", [])[0][0]
+        if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+            while self.db.select("PRAGMA freelist_count", [])[0][0] > 0:
+                self._timed(
+                    "incremental_vacuum",
+                    f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})",
+                )
+                yield
+        self._timed("optimize", "PRAGMA optimize")
+        yield
+        # copy the vacuumed pages out of the WAL and empty it, so the file shrinks
+        self._timed("checkpoint", "PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def prune_change_logs(self):
+        """
+        Delete the change log rows the in-memory summaries of this process applied.
+        A log is left alone if its summary was not built here: another process,
+        the app while maintenance.py runs, may still have to apply its rows.
+        Nothing is written if there is nothing to delete: every commit invalidates
+        the cached results
+        """
+        start = time.perf_counter()
+        for table, seq in (
+            ("SPENDING_CHANGES", spending_cube.applied_seq()),
+            ("DAILY_SPENDING_CHANGES", daily_spending.applied_seq()),
+        ):
+            if seq is None:
+                continue
+            applied = self.db.select(
+                f"SELECT 1 FROM {table} WHERE SEQ <= ? LIMIT 1", [seq]
+            )
+            if applied:
+                self.db.delete(f"DELETE FROM {table} WHERE SEQ <= ?", [seq])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.timings_ms["prune"] = self.timings_ms.get("prune", 0) + elapsed_ms
+
+    def run_for(self, budget_ms: float) -> bool:
+        """
+        Run steps until budget_ms is spent. Returns True once the run is complete
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        while not self.done and time.perf_counter() < deadline:
+            try:
+                next(self._steps)
+            except StopIteration:
+                self.done = True
+                self.log_summary()
+        return self.done
+
+    def log_summary(self):
+        timings = ", ".join(
+            f"{task} {ms:.1f}ms" for task, ms in self.timings_ms.items()
+        )
+        logger.info(
+            "Maintenance of %s done: %.2f MB -> %.2f MB (%s)",
+            self.db.db,
+            self.size_before / 1e6,
+            get_file_size(self.db.db) / 1e6,
+            timings,
+        )
+
+
+def convert_to_incremental_vacuum(db: DBManager) -> bool:
+    """
+    Databases created before auto_vacuum = INCREMENTAL was in the pragma profile
+    need a full VACUUM for the setting to take effect. It rewrites the whole file,
+    so it is only run on request: python maintenance.py convert-vacuum.
+    Does nothing if the profile sets another auto_vacuum mode (DB_AUTO_VACUUM).
+    Returns True if converted
+    """
+    mode = load_pragma_profile()["auto_vacuum"].upper()
+    if mode not in ("INCREMENTAL", str(AUTO_VACUUM_INCREMENTAL)):
+        logger.info("Not converting %s, DB_AUTO_VACUUM is %s", db.db, mode)
+        return False
+    if db.select("PRAGMA auto_vacuum", [])[0][0] == AUTO_VACUUM_INCREMENTAL:
+        return False
+    size_before = get_file_size(db.db)
+    start = time.perf_counter()
+    db.select("PRAGMA auto_vacuum = INCREMENTAL", [])
+    db.select("VACUUM", [])
+    db.select("PRAGMA wal_checkpoint(TRUNCATE)", [])
+    logger.info(
+        "Converted %s to incremental vacuum: %.2f MB -> %.2f MB in %.2fs",
+        db.db,
+        size_before / 1e6,
+        get_file_size(db.db) / 1e6,
+        time.perf_counter() - start,
+    )
+    return True
+
+
+class MaintenanceScheduler:
+    """
+    Watches user input on a Tk window and runs maintenance in budgeted steps
+    once the app has been idle for IDLE_SECONDS, at most every interval_hours
+    """
+
+    def __init__(self, widget, interval_hours: float = None):
+        self.widget = widget
+        if interval_hours is None:
+            interval_hours = float(
+                os.getenv("DB_MAINTENANCE_INTERVAL_HOURS", str(DEFAULT_INTERVAL_HOURS))
+            )
+        self.interval = interval_hours * 3600
+        self.last_activity = time.monotonic()
+        self.last_run = None
+        self.maintenance = None
+        self.pending_step = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        for sequence in ("<Any-KeyPress>", "<Any-ButtonPress>", "<MouseWheel>"):
+            self.widget.bind_all(sequence, self.on_activity, add="+")
+        self.widget.after(CHECK_INTERVAL_MS, self.check)
+
+    def on_activity(self, event=None):
+        self.last_activity = time.monotonic()
+
+    def is_due(self) -> bool:
+        if self.maintenance is not None:
+            return True
+        if self.last_run is None:
+            return True
+        return time.monotonic() - self.last_run >= self.interval
+
+    def check(self):
+        if not self.widget.winfo_exists():
+            return
+        idle = time.monotonic() - self.last_activity >= IDLE_SECONDS
+        if idle and self.pending_step is None and self.is_due():
+            if self.maintenance is None:
+                self.maintenance = Maintenance(DBManager())
+            future = loader.submit(self.maintenance.run_for, STEP_BUDGET_MS)
+            self.pending_step = future
+            when_done(self.widget, future, self.on_step_done, self.on_step_error)
+        self.widget.after(CHECK_INTERVAL_MS, self.check)
+
+    def on_step_done(self, done: bool):
+        self.pending_step = None
+        if done:
+            self.maintenance = None
+            self.last_run = time.monotonic()
+
+    def on_step_error(self, error: BaseException):
+        logger.error("Database maintenance failed: %s", error)
+        self.pending_step = None
+        self.maintenance = None
+        self.last_run = time.monotonic()
+
+    def shutdown(self):
+        """
+        Finish or make progress on maintenance before the app closes.
+        Runs on the calling thread, after the worker threads are stopped
+        """
+        db = DBManager()
+        try:
+            if self.is_due():
+                Maintenance(db).run_for(SHUTDOWN_BUDGET_MS)
+            else:
+                db.select("PRAGMA optimize", [])
+        except Exception as e:
+            logger.error("Database maintenance on shutdown failed: %s", e)
@@ -0,0 +1,15 @@
+-- Month summaries filter on date, optionally per category, and sum the amount.
+-- Amount is included so those queries are answered from the index alone
+CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_DATE
+    ON TRANSACTIONS (DATE, CATEGORY, AMOUNT);
+
+CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_CATEGORY_DATE
+    ON TRANSACTIONS (CATEGORY, DATE, AMOUNT);
+
+-- Deleting a file's transactions
+CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_FILE_ID
+    ON TRANSACTIONS (FILE_ID);
+
+-- Re-running inference
+CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_INFERRED_CATEGORY
+    ON TRANSACTIONS (INFERRED_CATEGORY);
@@ -0,0 +1,3 @@
+-- Effective budget lookups: latest start_date <= month for a category
+CREATE INDEX IF NOT EXISTS IDX_BUDGETS_CATEGORY_START_DATE
+    ON BUDGETS (CATEGORY, START_DATE, AMOUNT);
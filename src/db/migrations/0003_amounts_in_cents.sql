@@ -0,0 +1,73 @@
+-- Store money as integer cents instead of DECIMAL (REAL affinity in sqlite).
+-- The columns keep the name AMOUNT. DBManager's to_cents / from_cents convert at the boundary.
+-- sqlite cannot change a column type in place, so both tables are rebuilt.
+-- Half cents are rounded away from zero like to_cents: rounding to 6 digits first drops
+-- the binary representation error, so 1.005 becomes 101 cents, not 100.
+
+CREATE TABLE TRANSACTIONS_NEW (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CODE VARCHAR(20),
+    AMOUNT INTEGER NOT NULL, -- cents
+    CURRENCY VARCHAR(3) NOT NULL DEFAULT 'CAD',
+    DATE DATE NOT NULL,
+    DESCRIPTION VARCHAR(255),
+    CATEGORY VARCHAR(20) NOT NULL,
+    INFERRED_CATEGORY INTEGER NOT NULL DEFAULT 0,
+    FILE_ID INTEGER,
+    FOREIGN KEY (CATEGORY) REFERENCES CATEGORIES (CATEGORY),
+    FOREIGN KEY (CURRENCY) REFERENCES CURRENCIES (CODE),
+    FOREIGN KEY (FILE_ID) REFERENCES FILES (ID)
+);
+
+INSERT INTO TRANSACTIONS_NEW
+    (ID, CODE, AMOUNT, CURRENCY, DATE, DESCRIPTION, CATEGORY, INFERRED_CATEGORY, FILE_ID)
+SELECT ID, CODE, CAST(ROUND(ROUND(AMOUNT * 100, 6)) AS INTEGER), CURRENCY, DATE, DESCRIPTION,
+    CATEGORY, INFERRED_CATEGORY, FILE_ID
+FROM TRANSACTIONS;
+
+-- keep ids of deleted rows from being reused
+UPDATE sqlite_sequence
+SET seq = MAX(seq, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'TRANSACTIONS'), 0))
+WHERE name = 'TRANSACTIONS_NEW';
+INSERT INTO sqlite_sequence (name, seq)
+SELECT 'TRANSACTIONS_NEW', seq FROM sqlite_sequence
+WHERE name = 'TRANSACTIONS'
+AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'TRANSACTIONS_NEW');
+
+DROP TABLE TRANSACTIONS;
+ALTER TABLE TRANSACTIONS_NEW RENAME TO TRANSACTIONS;
+
+CREATE INDEX IDX_TRANSACTIONS_DATE ON TRANSACTIONS (DATE, CATEGORY, AMOUNT);
+CREATE INDEX IDX_TRANSACTIONS_CATEGORY_DATE ON TRANSACTIONS (CATEGORY, DATE, AMOUNT);
+CREATE INDEX IDX_TRANSACTIONS_FILE_ID ON TRANSACTIONS (FILE_ID);
+CREATE INDEX IDX_TRANSACTIONS_INFERRED_CATEGORY ON TRANSACTIONS (INFERRED_CATEGORY);
+
+CREATE TABLE BUDGETS_NEW (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CATEGORY VARCHAR(20) NOT NULL,
+    AMOUNT INTEGER NOT NULL, -- cents
+    CURRENCY VARCHAR(3) NOT NULL DEFAULT 'CAD',
+    -- date should be in the format YYYY-MM
+    START_DATE TEXT NOT NULL CHECK (START_DATE LIKE '____-__'),
+    FOREIGN KEY (CATEGORY) REFERENCES CATEGORIES (CATEGORY),
+    FOREIGN KEY (CURRENCY) REFERENCES CURRENCIES (CODE)
+    UNIQUE (CATEGORY, START_DATE)
+);
+
+INSERT INTO BUDGETS_NEW (ID, CATEGORY, AMOUNT, CURRENCY, START_DATE)
+SELECT ID, CATEGORY, CAST(ROUND(ROUND(AMOUNT * 100, 6)) AS INTEGER), CURRENCY, START_DATE
+FROM BUDGETS;
+
+-- keep ids of deleted rows from being reused
+UPDATE sqlite_sequence
+SET seq = MAX(seq, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'BUDGETS'), 0))
+WHERE name = 'BUDGETS_NEW';
+INSERT INTO sqlite_sequence (name, seq)
+SELECT 'BUDGETS_NEW', seq FROM sqlite_sequence
+WHERE name = 'BUDGETS'
+AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'BUDGETS_NEW');
+
+DROP TABLE BUDGETS;
+ALTER TABLE BUDGETS_NEW RENAME TO BUDGETS;
+
+CREATE INDEX IDX_BUDGETS_CATEGORY_START_DATE ON BUDGETS (CATEGORY, START_DATE, AMOUNT);
@@ -0,0 +1,47 @@
+-- Spend per month and category, kept up to date by triggers on TRANSACTIONS.
+-- Summaries read this instead of grouping every transaction.
+CREATE TABLE MONTHLY_CATEGORY_TOTALS (
+    MONTH TEXT NOT NULL, -- YYYY-MM
+    CATEGORY VARCHAR(20) NOT NULL,
+    TOTAL INTEGER NOT NULL DEFAULT 0, -- cents
+    COUNT INTEGER NOT NULL DEFAULT 0, -- number of transactions
+    PRIMARY KEY (MONTH, CATEGORY)
+) WITHOUT ROWID;
+
+INSERT INTO MONTHLY_CATEGORY_TOTALS (MONTH, CATEGORY, TOTAL, COUNT)
+SELECT strftime('%Y-%m', DATE), CATEGORY, SUM(AMOUNT), COUNT(*)
+FROM TRANSACTIONS
+GROUP BY strftime('%Y-%m', DATE), CATEGORY;
+
+CREATE TRIGGER TRG_TRANSACTIONS_TOTALS_INSERT AFTER INSERT ON TRANSACTIONS
+BEGIN
+    INSERT INTO MONTHLY_CATEGORY_TOTALS (MONTH, CATEGORY, TOTAL, COUNT)
+    VALUES (strftime('%Y-%m', NEW.DATE), NEW.CATEGORY, NEW.AMOUNT, 1)
+    ON CONFLICT (MONTH, CATEGORY) DO UPDATE
+    SET TOTAL = TOTAL + excluded.TOTAL, COUNT = COUNT + 1;
+END;
+
+CREATE TRIGGER TRG_TRANSACTIONS_TOTALS_DELETE AFTER DELETE ON TRANSACTIONS
+BEGIN
+    UPDATE MONTHLY_CATEGORY_TOTALS
+    SET TOTAL = TOTAL - OLD.AMOUNT, COUNT = COUNT - 1
+    WHERE MONTH = strftime('%Y-%m', OLD.DATE) AND CATEGORY = OLD.CATEGORY;
+
+    DELETE FROM MONTHLY_CATEGORY_TOTALS
+    WHERE MONTH = strftime('%Y-%m', OLD.DATE) AND CATEGORY = OLD.CATEGORY AND COUNT <= 0;
+END;
+
+CREATE TRIGGER TRG_TRANSACTIONS_TOTALS_UPDATE AFTER UPDATE OF DATE, CATEGORY, AMOUNT ON TRANSACTIONS
+BEGIN
+    UPDATE MONTHLY_CATEGORY_TOTALS
+    SET TOTAL = TOTAL - OLD.AMOUNT, COUNT = COUNT - 1
+    WHERE MONTH = strftime('%Y-%m', OLD.DATE) AND CATEGORY = OLD.CATEGORY;
+
+    DELETE FROM MONTHLY_CATEGORY_TOTALS
+    WHERE MONTH = strftime('%Y-%m', OLD.DATE) AND CATEGORY = OLD.CATEGORY AND COUNT <= 0;
+
+    INSERT INTO MONTHLY_CATEGORY_TOTALS (MONTH, CATEGORY, TOTAL, COUNT)
+    VALUES (strftime('%Y-%m', NEW.DATE), NEW.CATEGORY, NEW.AMOUNT, 1)
+    ON CONFLICT (MONTH, CATEGORY) DO UPDATE
+    SET TOTAL = TOTAL + excluded.TOTAL, COUNT = COUNT + 1;
+END;
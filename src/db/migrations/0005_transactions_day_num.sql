@@ -0,0 +1,9 @@
+-- Integer day numbers, so date ranges are integer index range scans
+-- DAY_NUM: days since 1970-01-01
+-- Written by the application with src.db.dates
+ALTER TABLE TRANSACTIONS ADD COLUMN DAY_NUM INTEGER;
+
+UPDATE TRANSACTIONS
+SET DAY_NUM = CAST(julianday(DATE) - julianday('1970-01-01') AS INTEGER);
+
+CREATE INDEX IDX_TRANSACTIONS_DAY_NUM ON TRANSACTIONS (DAY_NUM, CATEGORY, AMOUNT);
@@ -0,0 +1,31 @@
+-- Full text index over transaction descriptions and codes, used by the Transactions search.
+-- External content table: the text is stored once, in TRANSACTIONS, and triggers keep the index in sync
+CREATE VIRTUAL TABLE TRANSACTIONS_FTS USING fts5(
+    DESCRIPTION,
+    CODE,
+    content = 'TRANSACTIONS',
+    content_rowid = 'ID',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+INSERT INTO TRANSACTIONS_FTS (TRANSACTIONS_FTS) VALUES ('rebuild');
+
+CREATE TRIGGER TRG_TRANSACTIONS_FTS_INSERT AFTER INSERT ON TRANSACTIONS
+BEGIN
+    INSERT INTO TRANSACTIONS_FTS (rowid, DESCRIPTION, CODE)
+    VALUES (NEW.ID, NEW.DESCRIPTION, NEW.CODE);
+END;
+
+CREATE TRIGGER TRG_TRANSACTIONS_FTS_DELETE AFTER DELETE ON TRANSACTIONS
+BEGIN
+    INSERT INTO TRANSACTIONS_FTS (TRANSACTIONS_FTS, rowid, DESCRIPTION, CODE)
+    VALUES ('delete', OLD.ID, OLD.DESCRIPTION, OLD.CODE);
+END;
+
+CREATE TRIGGER TRG_TRANSACTIONS_FTS_UPDATE AFTER UPDATE OF DESCRIPTION, CODE ON TRANSACTIONS
+BEGIN
+    INSERT INTO TRANSACTIONS_FTS (TRANSACTIONS_FTS, rowid, DESCRIPTION, CODE)
+    VALUES ('delete', OLD.ID, OLD.DESCRIPTION, OLD.CODE);
+    INSERT INTO TRANSACTIONS_FTS (rowid, DESCRIPTION, CODE)
+    VALUES (NEW.ID, NEW.DESCRIPTION, NEW.CODE);
+END;
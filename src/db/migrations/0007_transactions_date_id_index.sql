@@ -0,0 +1,2 @@
+-- Keyset pagination of the transactions listing walks (DATE, ID)
+CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_DATE_ID ON TRANSACTIONS (DATE, ID);
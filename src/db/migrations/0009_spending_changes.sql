@@ -0,0 +1,39 @@
+-- Log of the (month, category) cells of MONTHLY_CATEGORY_TOTALS changed by each write,
+-- kept by triggers. The in-memory spending cube reads the rows past the last SEQ it applied
+-- and reloads only those cells. A row with a NULL MONTH means CATEGORIES changed.
+-- Rows the cube has applied are deleted by the database maintenance
+CREATE TABLE SPENDING_CHANGES (
+    SEQ INTEGER PRIMARY KEY AUTOINCREMENT,
+    MONTH TEXT, -- YYYY-MM
+    CATEGORY VARCHAR(20)
+);
+
+CREATE TRIGGER TRG_TOTALS_CHANGES_INSERT AFTER INSERT ON MONTHLY_CATEGORY_TOTALS
+BEGIN
+    INSERT INTO SPENDING_CHANGES (MONTH, CATEGORY) VALUES (NEW.MONTH, NEW.CATEGORY);
+END;
+
+CREATE TRIGGER TRG_TOTALS_CHANGES_UPDATE AFTER UPDATE ON MONTHLY_CATEGORY_TOTALS
+BEGIN
+    INSERT INTO SPENDING_CHANGES (MONTH, CATEGORY) VALUES (NEW.MONTH, NEW.CATEGORY);
+END;
+
+CREATE TRIGGER TRG_TOTALS_CHANGES_DELETE AFTER DELETE ON MONTHLY_CATEGORY_TOTALS
+BEGIN
+    INSERT INTO SPENDING_CHANGES (MONTH, CATEGORY) VALUES (OLD.MONTH, OLD.CATEGORY);
+END;
+
+CREATE TRIGGER TRG_CATEGORIES_CHANGES_INSERT AFTER INSERT ON CATEGORIES
+BEGIN
+    INSERT INTO SPENDING_CHANGES (MONTH, CATEGORY) VALUES (NULL, NULL);
+END;
+
+CREATE TRIGGER TRG_CATEGORIES_CHANGES_UPDATE AFTER UPDATE ON CATEGORIES
+BEGIN
+    INSERT INTO SPENDING_CHANGES (MONTH, CATEGORY) VALUES (NULL, NULL);
+END;
+
+CREATE TRIGGER TRG_CATEGORIES_CHANGES_DELETE AFTER DELETE ON CATEGORIES
+BEGIN
+    INSERT INTO SPENDING_CHANGES (MONTH, CATEGORY) VALUES (NULL, NULL);
+END;
@@ -0,0 +1,45 @@
+-- Log of the amount and transaction count each write adds to a (day, category), kept by
+-- triggers on TRANSACTIONS. The in-memory daily spending sums read the rows past the last
+-- SEQ they applied and add them in. A row with a NULL DAY_NUM means CATEGORIES changed.
+-- Rows the sums have applied are deleted by the database maintenance
+CREATE TABLE DAILY_SPENDING_CHANGES (
+    SEQ INTEGER PRIMARY KEY AUTOINCREMENT,
+    DAY_NUM INTEGER, -- days since 1970-01-01
+    CATEGORY VARCHAR(20),
+    AMOUNT INTEGER, -- cents
+    COUNT INTEGER
+);
+
+CREATE TRIGGER TRG_TRANSACTIONS_DAILY_CHANGES_INSERT AFTER INSERT ON TRANSACTIONS
+BEGIN
+    INSERT INTO DAILY_SPENDING_CHANGES (DAY_NUM, CATEGORY, AMOUNT, COUNT)
+    VALUES (NEW.DAY_NUM, NEW.CATEGORY, NEW.AMOUNT, 1);
+END;
+
+CREATE TRIGGER TRG_TRANSACTIONS_DAILY_CHANGES_DELETE AFTER DELETE ON TRANSACTIONS
+BEGIN
+    INSERT INTO DAILY_SPENDING_CHANGES (DAY_NUM, CATEGORY, AMOUNT, COUNT)
+    VALUES (OLD.DAY_NUM, OLD.CATEGORY, -OLD.AMOUNT, -1);
+END;
+
+CREATE TRIGGER TRG_TRANSACTIONS_DAILY_CHANGES_UPDATE
+AFTER UPDATE OF DAY_NUM, CATEGORY, AMOUNT ON TRANSACTIONS
+BEGIN
+    INSERT INTO DAILY_SPENDING_CHANGES (DAY_NUM, CATEGORY, AMOUNT, COUNT)
+    VALUES (OLD.DAY_NUM, OLD.CATEGORY, -OLD.AMOUNT, -1), (NEW.DAY_NUM, NEW.CATEGORY, NEW.AMOUNT, 1);
+END;
+
+CREATE TRIGGER TRG_CATEGORIES_DAILY_CHANGES_INSERT AFTER INSERT ON CATEGORIES
+BEGIN
+    INSERT INTO DAILY_SPENDING_CHANGES (DAY_NUM) VALUES (NULL);
+END;
+
+CREATE TRIGGER TRG_CATEGORIES_DAILY_CHANGES_UPDATE AFTER UPDATE ON CATEGORIES
+BEGIN
+    INSERT INTO DAILY_SPENDING_CHANGES (DAY_NUM) VALUES (NULL);
+END;
+
+CREATE TRIGGER TRG_CATEGORIES_DAILY_CHANGES_DELETE AFTER DELETE ON CATEGORIES
+BEGIN
+    INSERT INTO DAILY_SPENDING_CHANGES (DAY_NUM) VALUES (NULL);
+END;
@@ -0,0 +1,72 @@
+"""
+    Versioned schema migrations.
+    Migrations are the sql files in MIGRATIONS_DIR, named <version>_<name>.sql.
+    The version of a database is stored in PRAGMA user_version.
+    A database created from schema.sql is at version 0.
+"""
+
+import os
+import re
+import sqlite3
+import logging
+
+MIGRATIONS_DIR = "src/db/migrations"
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+def get_migrations(migrations_dir=MIGRATIONS_DIR) -> list[tuple[int, str, str]]:
+    """
+    Returns a list of (version, name, path) sorted by version
+    """
+    migrations = []
+    for filename in os.listdir(migrations_dir):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version, name = int(match.group(1)), match.group(2)
+        migrations.append((version, name, os.path.join(migrations_dir, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {migrations_dir}")
+    return migrations
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def set_version(conn: sqlite3.Connection, version: int):
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+    conn.commit()
+
+
+def migrate(conn: sqlite3.Connection, migrations_dir=MIGRATIONS_DIR) -> list[int]:
+    """
+    Apply every migration newer than the database version, each in its own transaction.
+    Returns the versions that were applied
+    """
+    current = get_version(conn)
+    applied = []
+    for version, name, path in get_migrations(migrations_dir):
+        if version <= current:
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            sql = f.read()
+        logger.info("Applying migration %s (%s)", version, name)
+        try:
+            # the version is bumped in the same transaction as the migration
+            conn.executescript(
+                f"BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;"
+            )
+        except sqlite3.Error as e:
+            logger.error("Migration %s (%s) failed: %s", version, name, e)
+            if conn.in_transaction:
+                conn.rollback()
+            raise e
+        applied.append(version)
+    if applied:
+        logger.info("Database migrated from version %s to %s", current, applied[-1])
+    return applied
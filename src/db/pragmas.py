@@ -0,0 +1,64 @@
+"""
+    SQLite PRAGMA profile applied to every pooled connection.
+    Each setting can be overridden in the .env.dev / .env.prod file with DB_<NAME>,
+    e.g. DB_JOURNAL_MODE=DELETE or DB_CACHE_SIZE=-64000
+"""
+
+import re
+import sqlite3
+import os
+import logging
+
+# WAL lets the Tk thread read while the CSV import thread writes
+DEFAULT_PRAGMAS = {
+    # only takes effect on new databases, convert others with maintenance.py convert-vacuum
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # safe with WAL, one fsync per checkpoint
+    "cache_size": "-16000",  # negative is KiB, so ~16MB
+    "mmap_size": "134217728",  # 128MB
+    "temp_store": "MEMORY",
+    "busy_timeout": "5000",  # ms
+}
+VALID_VALUE_PATTERN = re.compile(r"^-?\w+$")
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+def get_env_var(name: str) -> str:
+    return f"DB_{name.upper()}"
+
+
+def load_pragma_profile() -> dict:
+    """
+    Default profile, overridden by environment variables
+    """
+    profile = {}
+    for name, default in DEFAULT_PRAGMAS.items():
+        value = os.getenv(get_env_var(name), default).strip()
+        if not VALID_VALUE_PATTERN.match(value):
+            raise ValueError(f"Invalid value for {get_env_var(name)}: {value}")
+        profile[name] = value
+    return profile
+
+
+def apply_pragmas(conn: sqlite3.Connection, profile: dict):
+    # setting auto_vacuum fails at once if another connection is writing, and on
+    # a database that has tables it has no effect anyway, so only set it on new ones
+    is_new = conn.execute("PRAGMA page_count").fetchone()[0] == 0
+    for name, value in profile.items():
+        if name == "auto_vacuum" and not is_new:
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def pragma_report(conn: sqlite3.Connection, profile: dict) -> dict:
+    """
+    The value sqlite actually uses for each setting in the profile.
+    May differ from the requested one, e.g. WAL is not available for in memory databases
+    """
+    report = {}
+    for name in profile:
+        row = conn.execute(f"PRAGMA {name}").fetchone()
+        report[name] = row[0] if row else None
+    return report
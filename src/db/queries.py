@@ -0,0 +1,160 @@
+"""
+    Registry of named, parameterized statements.
+    Values are always passed as parameters, so each statement has a single text
+    and is prepared once per connection by sqlite3's statement cache.
+"""
+
+import threading
+from collections import Counter, OrderedDict
+import sqlite3
+
+
+class QueryRegistry:
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self.uses = Counter()
+
+    def register(self, name: str, sql: str):
+        if name in self._queries:
+            raise ValueError(f"Query {name} is already registered")
+        self._queries[name] = sql
+
+    def get(self, name: str) -> str:
+        with self._lock:
+            self.uses[name] += 1
+        return self._queries[name]
+
+    def names(self) -> list[str]:
+        return list(self._queries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.uses)
+
+
+class StatementCacheStats:
+    """
+    Mirrors the LRU statement cache that sqlite3 keeps for each connection,
+    to count how often a statement is reused instead of being re-parsed
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # each thread uses a single pooled connection, so track its cache per thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, conn: sqlite3.Connection, sql: str) -> bool:
+        local = self._local
+        if getattr(local, "conn_id", None) != id(conn):
+            # new connection, its statement cache starts empty
+            local.conn_id = id(conn)
+            local.cache = OrderedDict()
+        cache = local.cache
+        hit = sql in cache
+        if hit:
+            cache.move_to_end(sql)
+        else:
+            cache[sql] = None
+            if len(cache) > self.capacity:
+                cache.popitem(last=False)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+QUERIES = QueryRegistry()
+
+QUERIES.register(
+    "transactions",
+    """
+        SELECT t.id, t.date, t.description, t.amount, t.category, t.code, t.inferred_category, f.filename
+        FROM transactions t LEFT OUTER JOIN files f ON t.file_id = f.id
+        ORDER BY t.date DESC
+    """,
+)
+
+QUERIES.register(
+    "update_transaction",
+    """
+        UPDATE transactions
+        SET date = :date, description = :description,
+            amount = :amount, category = :category, code = :code, inferred_category = 0,
+            day_num = :day_num
+        WHERE id = :id
+    """,
+)
+
+QUERIES.register(
+    "delete_transaction",
+    """
+        DELETE FROM transactions
+        WHERE id = ?
+    """,
+)
+
+QUERIES.register(
+    "delete_file_transactions",
+    """
+        DELETE FROM transactions
+        WHERE file_id = ?
+    """,
+)
+
+QUERIES.register(
+    "mark_file_deleted",
+    """
+        UPDATE files
+        SET status = 'Deleted'
+        WHERE id = ?
+    """,
+)
+
+QUERIES.register(
+    "update_budget",
+    """
+        UPDATE budgets
+        SET start_date = :start_date, amount = :amount, category = :category
+        WHERE id = :id
+    """,
+)
+
+QUERIES.register(
+    "delete_budget",
+    """
+        DELETE FROM budgets
+        WHERE id = ?
+    """,
+)
+
+QUERIES.register(
+    "update_category",
+    """
+        UPDATE categories
+        SET category = :category, description = :description, income = :income
+        WHERE category = :old_category
+    """,
+)
+
+QUERIES.register(
+    "delete_category",
+    """
+        DELETE FROM categories
+        WHERE category = ?
+    """,
+)
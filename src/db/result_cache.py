@@ -0,0 +1,124 @@
+"""
+    Memoization of data_summarizer results.
+    Results are keyed on the function, its arguments and DBManager.data_version(),
+    so any committed write makes every older entry unreachable. Those entries are
+    evicted like any other, least recently used first.
+    DataFrames are copied on the way in and out, callers are free to modify them.
+
+        @cached
+        def get_budgets_df(cols=None):
+            ...
+"""
+
+import os
+import functools
+import threading
+import logging
+from collections import OrderedDict
+import pandas as pd
+from src.db.dbmanager import DBManager
+
+DEFAULT_MAX_ENTRIES = 128
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+def freeze(value):
+    """
+    Hashable version of an argument: dicts and lists become tuples
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def copy_result(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy()
+    if isinstance(result, tuple):
+        return tuple(copy_result(item) for item in result)
+    if isinstance(result, list):
+        return [copy_result(item) for item in result]
+    return result
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns (True, result) on a hit, (False, None) on a miss
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+result_cache = ResultCache(
+    int(os.getenv("DB_RESULT_CACHE_ENTRIES", str(DEFAULT_MAX_ENTRIES)))
+)
+
+
+def cached(func):
+    """
+    Serve repeated calls with the same arguments from result_cache until the next write.
+    Calls inside a transaction are not cached.
+    The original function is available as func.__wrapped__
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if DBManager.thread_in_transaction():
+            # may see uncommitted writes, which are not counted until the commit
+            return func(*args, **kwargs)
+        # read before running the query: a write committed meanwhile
+        # files the result under the old version, where it is never read again
+        key = (
+            func.__qualname__,
+            freeze(args),
+            freeze(kwargs),
+            DBManager.data_version(),
+        )
+        hit, result = result_cache.get(key)
+        if hit:
+            return copy_result(result)
+        result = func(*args, **kwargs)
+        result_cache.put(key, copy_result(result))
+        return result
+
+    return wrapper
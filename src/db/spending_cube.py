@@ -0,0 +1,239 @@
+"""
+    Dense in-memory copy of MONTHLY_CATEGORY_TOTALS: an int64 array of months x categories,
+    with label arrays for both axes. Summaries and charts are slices and reductions of it.
+
+        cube = get_spending_cube()
+        cube.totals[cube.month_row("2024-03")]  # spend of every category in March, in cents
+
+    The months axis runs without gaps from the first to the last month with transactions.
+    Writes are picked up incrementally: triggers log the cells they change in SPENDING_CHANGES,
+    and only those cells are reloaded. A new month or category, or any change to CATEGORIES,
+    rebuilds the cube. A cube is never modified once built, a sync makes a new one,
+    so a cube can be read on any thread.
+"""
+
+import threading
+import logging
+import numpy as np
+from src.db.dbmanager import DBManager
+from src.db.dates import str_month_keys, month_from_key
+
+# income flag of categories that are in MONTHLY_CATEGORY_TOTALS but not in CATEGORIES
+UNKNOWN_CATEGORY = -1
+
+logger = logging.getLogger("main").getChild(__name__)
+
+
+def month_ordinals(keys):
+    """
+    Number of months since year 0 of month keys YYYYMM, consecutive months differ by 1
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys // 100 * 12 + keys % 100 - 1
+
+
+def month_key_range(first: int, last: int) -> np.ndarray:
+    ordinals = np.arange(month_ordinals(first), month_ordinals(last) + 1)
+    return ordinals // 12 * 100 + ordinals % 12 + 1
+
+
+def category_axis(categories, income, other_categories=()):
+    """
+    Sorted labels of CATEGORIES and of other_categories, which may not be in it,
+    with their income flags (UNKNOWN_CATEGORY if not in CATEGORIES)
+    """
+    income_by_category = dict(zip(categories, income))
+    labels = np.array(
+        sorted(set(income_by_category) | set(other_categories)), dtype=object
+    )
+    flags = np.array(
+        [income_by_category.get(c, UNKNOWN_CATEGORY) for c in labels], dtype=np.int8
+    )
+    return labels, flags
+
+
+class SpendingCube:
+    # cube used by the app, built on first use and synced after writes
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, categories, income, cells, seq=0, version=None):
+        """
+        categories, income: CATEGORIES rows
+        cells: (month, category, total, count) rows of MONTHLY_CATEGORY_TOTALS
+        seq: last SPENDING_CHANGES row the cells include
+        """
+        cells_categories = [cell[1] for cell in cells]
+        self.categories, self.income = category_axis(
+            categories, income, cells_categories
+        )
+        self.columns = {category: i for i, category in enumerate(self.categories)}
+        keys = str_month_keys([cell[0] for cell in cells])
+        if len(keys):
+            self.month_keys = month_key_range(keys.min(), keys.max())
+        else:
+            self.month_keys = np.array([], dtype=np.int64)
+        self.months = np.array([month_from_key(key) for key in self.month_keys])
+        self.first_ordinal = int(month_ordinals(self.month_keys[0])) if len(keys) else 0
+        shape = (len(self.month_keys), len(self.categories))
+        self.totals = np.zeros(shape, dtype=np.int64)
+        self.counts = np.zeros(shape, dtype=np.int64)
+        if len(keys):
+            rows = month_ordinals(keys) - self.first_ordinal
+            cols = np.array([self.columns[c] for c in cells_categories], dtype=np.int64)
+            self.totals[rows, cols] = [cell[2] for cell in cells]
+            self.counts[rows, cols] = [cell[3] for cell in cells]
+        self.seq = seq
+        self.version = version
+
+    @classmethod
+    def load(cls, db: DBManager = None, version=None):
+        db = db or DBManager()
+        # read first: changes committed while loading are applied again by the next sync
+        seq = get_head_seq(db)
+        categories = db.select("SELECT CATEGORY, INCOME FROM CATEGORIES", [])
+        cells = db.select(
+            "SELECT MONTH, CATEGORY, TOTAL, COUNT FROM MONTHLY_CATEGORY_TOTALS", []
+        )
+        return cls(
+            [row[0] for row in categories],
+            [row[1] for row in categories],
+            cells,
+            seq=seq,
+            version=version,
+        )
+
+    def month_row(self, month: str):
+        """
+        Row of month in totals and counts, None if it is outside the months axis
+        """
+        if not len(self.month_keys):
+            return None
+        row = int(month_ordinals(str_month_keys(month))) - self.first_ordinal
+        if 0 <= row < len(self.month_keys):
+            return row
+        return None
+
+    def month_totals(self, month: str) -> np.ndarray:
+        """
+        Spend of every category in month, in cents, zeros outside the months axis
+        """
+        row = self.month_row(month)
+        if row is None:
+            return np.zeros(len(self.categories), dtype=np.int64)
+        return self.totals[row]
+
+    def month_counts(self, month: str) -> np.ndarray:
+        row = self.month_row(month)
+        if row is None:
+            return np.zeros(len(self.categories), dtype=np.int64)
+        return self.counts[row]
+
+    def active_months(self) -> np.ndarray:
+        """
+        Rows of the months with transactions
+        """
+        return np.flatnonzero(self.counts.any(axis=1))
+
+    def with_changes(self, cells, seq: int, version=None):
+        """
+        New cube with the (month, category, total, count) cells replaced,
+        or None if a cell is outside the axes and the cube has to be rebuilt
+        """
+        keys = str_month_keys([cell[0] for cell in cells])
+        rows = month_ordinals(keys) - self.first_ordinal
+        cols = np.array(
+            [self.columns.get(cell[1], -1) for cell in cells], dtype=np.int64
+        )
+        outside = (rows < 0) | (rows >= len(self.month_keys)) | (cols < 0)
+        # a removed cell outside the axes changes nothing
+        counts = np.array([cell[3] for cell in cells], dtype=np.int64)
+        if (outside & (counts > 0)).any():
+            return None
+        inside = ~outside
+        cube = self.synced(seq, version)
+        cube.totals = self.totals.copy()
+        cube.counts = self.counts.copy()
+        cube.totals[rows[inside], cols[inside]] = np.array(
+            [cell[2] for cell in cells], dtype=np.int64
+        )[inside]
+        cube.counts[rows[inside], cols[inside]] = counts[inside]
+        return cube
+
+    def synced(self, seq: int, version=None):
+        """
+        Copy of the cube sharing its arrays, marked as synced up to seq
+        """
+        cube = object.__new__(SpendingCube)
+        cube.__dict__.update(self.__dict__)
+        cube.seq = seq
+        cube.version = version
+        return cube
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            version = DBManager.data_version()
+            if cls._shared is None:
+                cls._shared = cls.load(version=version)
+                logger.debug(
+                    "Built spending cube of %s months x %s categories",
+                    *cls._shared.totals.shape,
+                )
+            elif cls._shared.version != version:
+                cls._shared = sync(cls._shared, DBManager(), version)
+            return cls._shared
+
+    @classmethod
+    def shared_seq(cls):
+        with cls._shared_lock:
+            return None if cls._shared is None else cls._shared.seq
+
+
+def get_head_seq(db: DBManager) -> int:
+    rows = db.select(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'SPENDING_CHANGES'", []
+    )
+    return rows[0][0] if rows else 0
+
+
+def sync(cube: SpendingCube, db: DBManager, version=None) -> SpendingCube:
+    """
+    Cube up to date with the database, from the cells changed since cube.seq
+    """
+    seq = get_head_seq(db)
+    if seq == cube.seq:
+        return cube.synced(seq, version)
+    changes = db.select(
+        """
+            SELECT c.MONTH, c.CATEGORY, COALESCE(m.TOTAL, 0), COALESCE(m.COUNT, 0)
+            FROM (
+                SELECT DISTINCT MONTH, CATEGORY FROM SPENDING_CHANGES WHERE SEQ > ?
+            ) c
+            LEFT JOIN MONTHLY_CATEGORY_TOTALS m
+            ON m.MONTH = c.MONTH AND m.CATEGORY = c.CATEGORY
+        """,
+        [cube.seq],
+    )
+    if any(change[0] is None for change in changes):
+        return SpendingCube.load(db, version)
+    updated = cube.with_changes(changes, seq, version)
+    if updated is None:
+        return SpendingCube.load(db, version)
+    logger.debug("Spending cube: %s cells updated", len(changes))
+    return updated
+
+
+def get_spending_cube() -> SpendingCube:
+    """
+    The spending cube, synced with the writes committed since it was last used
+    """
+    return SpendingCube.shared()
+
+
+def applied_seq():
+    """
+    Last SPENDING_CHANGES row the cube has applied, None if there is no cube.
+    Rows up to it are no longer needed
+    """
+    return SpendingCube.shared_seq()
@@ -153,7 +153,8 @@ class NumberField(FormField):
         super().__init__(name, FieldType.NUMBER, required, form, display_name)
 
     def validate_value(self, value: str) -> (bool, str):
-        valid = value.replace(".", "").isdigit()
+        # at most one decimal point, so the amount always parses in to_cents
+        valid = value.replace(".", "", 1).isdigit()
         if not valid:
             return (False, "Invalid number")
         return (True, None)
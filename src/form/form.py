@@ -16,8 +16,11 @@ from src.form.fields import (
     UploadFileField,
     CheckBoxField,
 )
-from src.db.dbmanager import DBManager
-from src.tools.inference import infer_categories
+from src.db.dbmanager import DBManager, to_cents
+from src.db.queries import QUERIES
+from src.db.budget_index import invalidate_budget_index
+from src.db.dates import day_num, day_nums
+from src.tools.inference import infer_categories, PreviousCategories
 
 
 def confirm_selection(func):
@@ -344,7 +347,11 @@ class TransactionsCsvForm(EditForm):
                 logger.debug("create_data_from_csv: got csv with data\n: %s", df)
                 # validate column names
                 expected_columns = ["Date", "Description", "Amount", "Category", "Code"]
-                auto_added_columns = ["Inferred_Category", "file_id"]
+                auto_added_columns = [
+                    "Inferred_Category",
+                    "file_id",
+                    "Day_Num",
+                ]
                 missing_cols = [
                     col for col in expected_columns if col not in df.columns
                 ]
@@ -359,10 +366,10 @@ class TransactionsCsvForm(EditForm):
                 df["Amount"] = df["Amount"].apply(
                     lambda x: float(x.replace(",", "")) if isinstance(x, str) else x
                 )
-                df["Amount"] = df["Amount"].apply(lambda x: round(x, 2))
+                # stored as integer cents
+                df["Amount"] = to_cents(df["Amount"])
                 # validate data types
                 df["Date"] = pd.to_datetime(df["Date"], format="mixed", dayfirst=False)
-                # round to 2 decimal places
                 # validate date
                 today = pd.Timestamp.today()
                 erroneous_dates = df[df["Date"] > today]["Date"]
@@ -377,6 +384,7 @@ class TransactionsCsvForm(EditForm):
                         file_record_id, "Error", "Date cannot be in the future"
                     )
                     return (False, "Date cannot be in the future")
+                df["Day_Num"] = day_nums(df["Date"])
                 # convert dates to YYYY-MM-DD string
                 df["Date"] = df["Date"].apply(
                     lambda x: x.strftime("%Y-%m-%d") if not pd.isnull(x) else None
@@ -424,25 +432,28 @@ class TransactionsCsvForm(EditForm):
                 data = df[cols].to_records(index=False).tolist()
                 logger.debug("create_data_from_csv: data to insert: %s", data)
 
-                # TODO: make this a transaction
-                self.db.insert_many(
-                    f"""
-                        INSERT INTO transactions ({', '.join(cols)})
-                        VALUES ({', '.join(['?'] * len(cols))})
-                    """,
-                    data,
-                )
+                with self.db.transaction():
+                    self.db.insert_many(
+                        f"""
+                            INSERT INTO transactions ({', '.join(cols)})
+                            VALUES ({', '.join(['?'] * len(cols))})
+                        """,
+                        data,
+                    )
+                    self.update_file_status(
+                        file_record_id, "Success", "Successfully processed"
+                    )
                 self.clear_form()
                 logger.info("create_data_from_csv: Successfully added transactions")
-                self.update_file_status(
-                    file_record_id, "Success", "Successfully processed"
-                )
                 return (True, "Successfully added transactions")
         except Exception as e:
             logger.error("create_data_from_csv: %s", e)
             logger.error(traceback.format_exc())
             self.update_file_status(file_record_id, "Error", str(e))
             return (False, str(e))
+        finally:
+            # runs on its own thread, so free the thread's pooled connection
+            self.db.release()
 
     def on_success(self) -> (bool, str):
         data = self.form_fields[0].get_value()
@@ -471,21 +482,9 @@ class TransactionsCsvForm(EditForm):
             return
         # delete transactions from file
         # keep file, but set state to deleted
-        self.db.delete(
-            f"""
-                DELETE FROM transactions
-                WHERE file_id = {self.entry_id}
-            """,
-            [],
-        )
-        self.db.update(
-            f"""
-                UPDATE files
-                SET status = 'Deleted'
-                WHERE id = {self.entry_id}
-            """,
-            [],
-        )
+        with self.db.transaction():
+            self.db.delete(QUERIES.get("delete_file_transactions"), [self.entry_id])
+            self.db.update(QUERIES.get("mark_file_deleted"), [self.entry_id])
         self.form_message_label.config(
             text="Successfully deleted file and its transactions",
             fg=ABForm.SUCCESS_COLOR,
@@ -527,7 +526,41 @@ class GenerateMonthlySummaryForm(ABForm):
         return (True, "Successfully generated summary")
 
 
+class GenerateRangeSummaryForm(ABForm):
+    """
+    Summary of any range of days, e.g. a pay period or a trip.
+    Listeners are called with notify_range(start, end)
+    """
+
+    def __init__(self, master: tk.Tk):
+        self.master = master
+        self.form = tk.Frame(self.master)
+        self.form.pack(pady=20)
+        self.form_fields = [
+            DateField("start", True, self.form, display_name="From (YYYY-MM-DD)"),
+            DateField("end", True, self.form, display_name="To (YYYY-MM-DD)"),
+        ]
+        self.listeners = []
+        super().__init__(self.form, self.form_fields, "Generate Range Summary")
+        super().create_form()
+
+    def register_listener(self, listener):
+        self.listeners.append(listener)
+
+    def on_success(self) -> (bool, str):
+        start, end = (field.get_value() for field in self.form_fields)
+        # dates in the YYYY-MM-DD format compare in date order
+        if start > end:
+            return (False, "The start date must be before the end date")
+        for listener in self.listeners:
+            listener.notify_range(start, end)
+        return (True, "Successfully generated summary")
+
+
 class EditTransactionForm(EditForm):
+    # transactions re-inferred at a time
+    INFERENCE_CHUNK_SIZE = 5000
+
     def __init__(self, master: tk.Tk, transaction_id: int):
         self.master = master
         self.form = tk.Frame(self.master)
@@ -594,15 +627,13 @@ class EditTransactionForm(EditForm):
         data = {}
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
+        data["amount"] = to_cents(data["amount"])
+        data["day_num"] = day_num(data["date"])
         try:
-            statement = f"""
-                    UPDATE transactions
-                    SET date = '{data["date"]}', description = '{data["description"]}',
-                        amount = {data["amount"]}, category = '{data["category"]}', code = '{data["code"]}', inferred_category = 0
-                    WHERE id = {self.transaction_id}
-            """
-
-            self.db.update(statement, [])
+            self.db.update(
+                QUERIES.get("update_transaction"),
+                {**data, "id": self.transaction_id},
+            )
         except Error as e:
             logger.error("Error updating transaction: %s", e)
             return (False, str(e))
@@ -617,13 +648,7 @@ class EditTransactionForm(EditForm):
                 text="Select a row first", fg=ABForm.ERROR_COLOR
             )
             return
-        self.db.delete(
-            f"""
-                DELETE FROM transactions
-                WHERE id = {self.transaction_id}
-            """,
-            [],
-        )
+        self.db.delete(QUERIES.get("delete_transaction"), [self.transaction_id])
         self.clear_form()
         self.form_message_label.config(
             text="Successfully deleted row", fg=ABForm.SUCCESS_COLOR
@@ -635,15 +660,24 @@ class EditTransactionForm(EditForm):
         data = {}
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
+        data["amount"] = to_cents(data["amount"])
         data["inferred_category"] = 0
-        cols = ["date", "description", "amount", "category", "code"]
+        data["day_num"] = day_num(data["date"])
+        cols = [
+            "date",
+            "description",
+            "amount",
+            "category",
+            "code",
+            "day_num",
+        ]
         vals = [data[col] for col in cols]
         vals.append(0)  # inferred category
         try:
             self.db.insert(
                 f"""
                     INSERT INTO transactions ({', '.join(cols)}, inferred_category)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    VALUES ({', '.join(['?'] * len(vals))})
                 """,
                 vals,
             )
@@ -662,43 +696,55 @@ class EditTransactionForm(EditForm):
 
     def run_inference(self):
         logger.debug("Re running inference")
-        # select all transactions with inferred_category = 1
-        transactions = self.db.select(
-            """
-                SELECT id, description, code, category FROM transactions
-                WHERE inferred_category = 1
-            """,
-            [],
-        )
-        transactions_df = pd.DataFrame(
-            transactions, columns=["id", "Description", "Code", "Category"]
-        )
-        transactions_df["Category"] = ""
-
-        # infer categories
         categories = [
             category[0]
             for category in self.db.select(
                 "SELECT category FROM categories WHERE category != 'Other' ", []
             )
         ]
-        # infer_categories modifies the dataframe in place
-        transactions_df = infer_categories(transactions_df, categories, self.db)
-
-        # update transactions
-        for _, row in transactions_df.iterrows():
-            try:
-                self.db.update(
-                    """
-                        UPDATE transactions
-                        SET category = ?
-                        WHERE id = ?
-                    """,
-                    [row["Category"], row["id"]],
-                )
-            except Error as e:
-                logger.error("Error updating transaction: %s", e)
-                # return (False, str(e))
+        # page through transactions with inferred_category = 1 by id, so memory stays bounded
+        # and no cursor is open over transactions while they are updated.
+        # Every page is updated in one commit, a failed update rolls back all of them
+        try:
+            with self.db.transaction():
+                previous = PreviousCategories(self.db)
+                last_id = 0
+                while True:
+                    transactions = self.db.select(
+                        """
+                            SELECT id, description, code, category FROM transactions
+                            WHERE inferred_category = 1 AND id > :last
+                            ORDER BY id
+                            LIMIT :limit
+                        """,
+                        {
+                            "last": last_id,
+                            "limit": EditTransactionForm.INFERENCE_CHUNK_SIZE,
+                        },
+                    )
+                    if not transactions:
+                        break
+                    last_id = transactions[-1][0]
+                    transactions_df = pd.DataFrame(
+                        transactions, columns=["id", "Description", "Code", "Category"]
+                    )
+                    transactions_df["Category"] = ""
+                    # infer_categories modifies the dataframe in place
+                    transactions_df = infer_categories(
+                        transactions_df, categories, self.db, previous
+                    )
+                    self.db.update_many(
+                        """
+                            UPDATE transactions
+                            SET category = ?
+                            WHERE id = ?
+                        """,
+                        transactions_df[["Category", "id"]].values.tolist(),
+                    )
+        except Error as e:
+            logger.error("Error updating transactions: %s", e)
+            self.form_message_label.config(text=str(e), fg=ABForm.ERROR_COLOR)
+            return (False, str(e))
         super().notify_update()
         self.form_message_label.config(
             text="Successfully inferred categories",
@@ -736,15 +782,24 @@ class AddTransactionForm(ABForm):
         data = {}
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
+        data["amount"] = to_cents(data["amount"])
         data["inferred_category"] = 0
-        cols = ["date", "description", "amount", "category", "code"]
+        data["day_num"] = day_num(data["date"])
+        cols = [
+            "date",
+            "description",
+            "amount",
+            "category",
+            "code",
+            "day_num",
+        ]
         vals = [data[col] for col in cols]
         vals.append(0)  # inferred category
         try:
             self.db.insert(
                 f"""
                     INSERT INTO transactions ({', '.join(cols)}, inferred_category)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    VALUES ({', '.join(['?'] * len(vals))})
                 """,
                 vals,
             )
@@ -817,18 +872,15 @@ class EditBudgetForm(EditForm):
         data = {}
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
+        data["amount"] = to_cents(data["amount"])
         try:
-            statement = f"""
-                    UPDATE budgets
-                    SET start_date = '{data["start_date"]}', amount = {data["amount"]},
-                        category = '{data["category"]}'
-                    WHERE id = {self.budget_id}
-            """
-
-            self.db.update(statement, [])
+            self.db.update(
+                QUERIES.get("update_budget"), {**data, "id": self.budget_id}
+            )
         except Error as e:
             logger.error("Error updating budget: %s", e)
             return (False, str(e))
+        invalidate_budget_index()
         self.notify_update()
         budget_descriptor = data["category"] + " " + data["start_date"]
         return (True, "Successfully updated budget for " + budget_descriptor)
@@ -840,13 +892,8 @@ class EditBudgetForm(EditForm):
                 text="Select a row first", fg=ABForm.ERROR_COLOR
             )
             return
-        self.db.delete(
-            f"""
-                DELETE FROM budgets
-                WHERE id = {self.budget_id}
-            """,
-            [],
-        )
+        self.db.delete(QUERIES.get("delete_budget"), [self.budget_id])
+        invalidate_budget_index()
         self.clear_form()
         self.form_message_label.config(
             text="Successfully deleted row", fg=ABForm.SUCCESS_COLOR
@@ -858,6 +905,7 @@ class EditBudgetForm(EditForm):
         data = {}
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
+        data["amount"] = to_cents(data["amount"])
         try:
             self.db.insert(
                 """
@@ -870,6 +918,7 @@ class EditBudgetForm(EditForm):
             logger.error("Error inserting budget: %s", e)
             self.form_message_label.config(text=str(e), fg=ABForm.ERROR_COLOR)
             return (False, str(e))
+        invalidate_budget_index()
         # self.clear_form()
         super().notify_update()
         budget_descriptor = data["category"] + " " + data["start_date"]
@@ -913,6 +962,7 @@ class AddBudgetForm(ABForm):
         data = {}
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
+        data["amount"] = to_cents(data["amount"])
         try:
             self.db.insert(
                 """
@@ -924,6 +974,7 @@ class AddBudgetForm(ABForm):
         except Error as e:
             logger.error("Error updating budget: %s", e)
             return (False, str(e))
+        invalidate_budget_index()
         budget_descriptor = data["category"] + " " + data["start_date"]
         return (True, "Successfully added budget " + budget_descriptor)
 
@@ -958,14 +1009,14 @@ class EditCategoryForm(EditForm):
         for field in self.form_fields:
             data[field.get_name()] = field.get_value()
         try:
-            statement = f"""
-                    UPDATE categories
-                    Set category = '{data["category"]}', description = '{data["description"]}',
-                        income = {1 if data["income"] else 0}
-                    WHERE category = '{self.category_name}'
-            """
-
-            self.db.update(statement, [])
+            self.db.update(
+                QUERIES.get("update_category"),
+                {
+                    **data,
+                    "income": 1 if data["income"] else 0,
+                    "old_category": self.category_name,
+                },
+            )
         except Error as e:
             logger.error("Error updating category: %s", e)
             return (False, str(e))
@@ -980,13 +1031,7 @@ class EditCategoryForm(EditForm):
                 text="Select a row first", fg=ABForm.ERROR_COLOR
             )
             return
-        self.db.delete(
-            f"""
-                DELETE FROM categories
-                WHERE category = '{self.category_name}'
-            """,
-            [],
-        )
+        self.db.delete(QUERIES.get("delete_category"), [self.category_name])
         self.clear_form()
         self.form_message_label.config(
             text="Successfully deleted row", fg=ABForm.SUCCESS_COLOR
@@ -1,8 +1,10 @@
+import logging
 import tkinter as tk
 import numpy as np
+import pandas as pd
 import calendar
 from datetime import datetime
-from tkinter import ttk
+from tkinter import ttk, filedialog, messagebox
 from abc import ABC, abstractmethod
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -10,23 +12,34 @@ from matplotlib.colors import LinearSegmentedColormap
 from src.form.form import (
     TransactionsCsvForm,
     GenerateMonthlySummaryForm,
+    GenerateRangeSummaryForm,
     EditTransactionForm,
     EditBudgetForm,
     EditCategoryForm,
 )
 from src.db.data_summarizer import (
     get_transactions_df,
-    get_transactions_totals_df,
-    get_budget_summary_df,
+    get_totals,
     get_budgets_df,
     get_files_df,
     get_categories_df,
+    export_transactions_csv,
+    get_transactions_page,
+    get_month_report,
+    get_month_reports,
+    get_range_report,
     get_budget_vs_spend_plt,
     get_spend_per_category_pie_chart_plt,
     get_budget_minus_spend_bar_chart_plt,
     get_budget_history_plt,
     get_income_vs_expenses_plt,
+    get_year_summary,
+    get_year_at_a_glance_plt,
 )
+from src.db.async_data import loader, when_done, log_error
+from src.db.dbmanager import DBManager
+
+logger = logging.getLogger("main").getChild(__name__)
 
 
 class EditableTable(tk.Frame):
@@ -39,15 +52,14 @@ class EditableTable(tk.Frame):
         primary_key="id",
         extra_callback=None,
         call_on_udpate=None,
+        get_page_func=None,
         **kwargs,
     ):
         super().__init__(parent, *args, **kwargs)
         self.get_data_func = get_data_func
-        self.data = get_data_func()
-        self.columns = list(self.data.columns)
-        self.display_columns = self.columns.copy()
-        if primary_key == "id":
-            self.display_columns.remove("id")
+        self.data = None
+        self.columns = []
+        self.display_columns = []
         self.table_frame = tk.Frame(self)
         self.table_frame.pack(side="bottom", fill="both", expand=True)
         self.edit_form_cls = edit_form_cls
@@ -64,10 +76,111 @@ class EditableTable(tk.Frame):
         self.extra_callback = extra_callback
         # Called whenever the table is updated, in case other widgets need to be refreshed
         self.call_on_update = call_on_udpate
+        # Optional get_page_func(after=, filters=, sort=) returning (df, cursor).
+        # If set, the table loads one page at a time and searches run in the query
+        self.get_page_func = get_page_func
+        self.page_filters = {}
+        self.page_sort = "desc"
+        self.page_sort_col = "date"
+        self.page_sort_asc = False
+        self.next_cursor = None
+        self.tree = None
+        self.load_more_button = None
         self.last_clicked_row_index = None  # index of last clicked row
+        self.pending_load = None
+        # data is loaded in the background, then the filters and table are shown
+        self.load_data(self.on_first_load)
+
+    def on_first_load(self):
+        self.columns = list(self.data.columns)
+        self.display_columns = self.columns.copy()
+        if self.primary_key == "id":
+            self.display_columns.remove("id")
         self.show_filters()
         self.show_table()
 
+    def show_placeholder(self, text="Loading..."):
+        if self.table_frame:
+            self.table_frame.destroy()
+        self.table_frame = tk.Frame(self)
+        self.table_frame.pack(fill="both", expand=True)
+        tk.Label(self.table_frame, text=text, font=("Arial", 15)).pack(pady=20)
+
+    def load_data(self, callback):
+        """
+        Load the data on a worker thread, then call callback on the Tk thread
+        """
+        self.show_placeholder()
+        if self.get_page_func:
+            future = loader.submit(
+                self.get_page_func,
+                after=None,
+                filters=dict(self.page_filters),
+                sort=self.page_sort,
+            )
+        else:
+            future = loader.submit(self.get_data_func)
+        self.pending_load = future
+
+        def on_loaded(data):
+            # ignore results of loads that were superseded by a newer one
+            if future is not self.pending_load:
+                return
+            if self.get_page_func:
+                data, self.next_cursor = data
+            self.data = data
+            callback()
+
+        def on_error(error):
+            logger.error("Error loading table data: %s", error)
+            self.show_placeholder("Could not load data")
+
+        when_done(self, future, on_loaded, on_error)
+
+    def load_next_page(self):
+        """
+        Append the page after the last loaded row
+        """
+        if self.next_cursor is None:
+            return
+        future = loader.submit(
+            self.get_page_func,
+            after=self.next_cursor,
+            filters=dict(self.page_filters),
+            sort=self.page_sort,
+        )
+        self.pending_load = future
+
+        def on_loaded(result):
+            if future is not self.pending_load or self.data is None:
+                return
+            page, self.next_cursor = result
+            self.data = pd.concat([self.data, page], ignore_index=True)
+            if self.page_sort_col != "date":
+                self.data = self.data.sort_values(
+                    by=self.page_sort_col, ascending=self.page_sort_asc
+                ).reset_index(drop=True)
+                self.show_table()
+                return
+            # pages come in display order, so only the new rows are inserted
+            for _, row in page.iterrows():
+                self.tree.insert(
+                    "", "end", values=[row[col] for col in self.display_columns]
+                )
+            self.show_load_more()
+
+        when_done(self, future, on_loaded)
+
+    def show_load_more(self):
+        if self.load_more_button:
+            self.load_more_button.destroy()
+            self.load_more_button = None
+        if self.next_cursor is not None:
+            self.load_more_button = tk.Button(
+                self.table_frame, text="Load more", command=self.load_next_page
+            )
+            self.load_more_button.pack(side="top", pady=5)
+
     def on_row_click(self, event):
         selected_row = event.widget.selection()
         if not selected_row:
@@ -89,7 +202,8 @@ class EditableTable(tk.Frame):
 
     def show_table(self):
         if self.data is None:
-            self.data = self.get_data_func()
+            self.load_data(self.show_table)
+            return
         # Create a Treeview widget to display the DataFrame
         if self.table_frame:
             self.table_frame.destroy()
@@ -102,6 +216,7 @@ class EditableTable(tk.Frame):
             show="headings",
         )
         tree.pack(side="top", fill="both", expand=True)
+        self.tree = tree
 
         # Add column headings
         for col in cols:
@@ -115,6 +230,10 @@ class EditableTable(tk.Frame):
             row_values = [row[col] for col in cols]
             tree.insert("", "end", values=row_values)
 
+        if self.get_page_func:
+            self.load_more_button = None
+            self.show_load_more()
+
         if self.extra_callback:
             self.extra_callback(self.data, self.table_frame)
 
@@ -196,6 +315,12 @@ class EditableTable(tk.Frame):
 
     def clear_filters(self):
         self.applied_search_filters = []
+        if self.get_page_func and (self.page_filters or self.page_sort != "desc"):
+            self.page_filters = {}
+            self.page_sort = "desc"
+            self.data = None
+        self.page_sort_col = "date"
+        self.page_sort_asc = False
         for filter_type, filter_value in self.filters:
             if filter_type == tk.Entry:
                 filter_value.set("")
@@ -209,9 +334,19 @@ class EditableTable(tk.Frame):
     def filter_table(
         self, sort_col, sort_asc, search_col, search_str, update_filters=True
     ):
+        if self.get_page_func:
+            self.filter_pages(
+                sort_col, sort_asc, search_col, search_str, update_filters
+            )
+            return
         # get the transactions df
         if self.data is None:
-            self.data = self.get_data_func()
+            self.load_data(
+                lambda: self.filter_table(
+                    sort_col, sort_asc, search_col, search_str, update_filters
+                )
+            )
+            return
         # filter by search string
         self.data = self.data[
             self.data[search_col]
@@ -229,9 +364,51 @@ class EditableTable(tk.Frame):
         self.show_applied_filters()
         self.show_table()
 
+    def filter_pages(
+        self, sort_col, sort_asc, search_col, search_str, update_filters=True
+    ):
+        """
+        filter_table for paged tables: searches and the date order are part of
+        the page query, so they apply to the whole history.
+        Other sort columns only sort the loaded rows
+        """
+        page_filters = dict(self.page_filters)
+        if search_str:
+            page_filters[search_col] = search_str
+        # other columns keep the page order and only sort the loaded rows
+        page_sort = self.page_sort
+        if sort_col == "date":
+            page_sort = "asc" if sort_asc else "desc"
+        if (
+            self.data is None
+            or page_filters != self.page_filters
+            or page_sort != self.page_sort
+        ):
+            self.page_filters = page_filters
+            self.page_sort = page_sort
+            self.data = None
+            self.load_data(
+                lambda: self.filter_pages(
+                    sort_col, sort_asc, search_col, search_str, update_filters
+                )
+            )
+            return
+        self.page_sort_col = sort_col
+        self.page_sort_asc = sort_asc
+        if sort_col != "date":
+            self.data = self.data.sort_values(
+                by=sort_col, ascending=sort_asc
+            ).reset_index(drop=True)
+        if search_str and update_filters:
+            self.applied_search_filters.append(search_col)
+        self.show_applied_filters()
+        self.show_table()
+
     def notify_update(self):
         self.data = None
-        self.show_table()
+        self.load_data(self.on_update_loaded)
+
+    def on_update_loaded(self):
         # keep applied filters, if any
         args = []
         for filter_type, filter_value in self.filters:
@@ -239,9 +416,14 @@ class EditableTable(tk.Frame):
                 args.append(filter_value.get())
         assert len(args) == 4
         self.filter_table(*args[:4], update_filters=False)
+        if self.call_on_update:
+            self.call_on_update()
 
-        # scroll to position of updated row
-        table = self.table_frame.children["!treeview"]
+        # scroll to position of updated row, unless the filters started a reload
+        # and the table is still the loading placeholder
+        table = self.table_frame.children.get("!treeview")
+        if table is None:
+            return
         table_length = len(table.get_children())
         if self.last_clicked_row_index:
             # if row is out of bounds, scroll to bottom
@@ -253,9 +435,6 @@ class EditableTable(tk.Frame):
                 row_item = table.get_children()[self.last_clicked_row_index]
                 table.selection_set(row_item)
 
-        if self.call_on_update:
-            self.call_on_update()
-
     def refresh(self):
         self.data = None
         self.applied_search_filters = []
@@ -307,13 +486,113 @@ class Home(ABPage):
         super().__init__(parent)
         self.budget_frame = tk.Frame(self.frame)
         self.budget_frame.pack(fill="both", expand=True)
+        self.pending_summary = None
+        # MonthReport by month, valid while the data version they were loaded at is current
+        self.month_reports = {}
+        self.month_reports_version = None
+        self.pending_reports = None
 
     def notify(self, month):
         self.clear_figures()
         self.budget_summary(month)
 
+    def precompute_month_reports(self):
+        """
+        Load the reports of all months in the background, from the spending cube
+        """
+        version = DBManager.data_version()
+        if self.pending_reports is not None:
+            return
+        future = loader.submit(get_month_reports)
+        self.pending_reports = future
+
+        def on_loaded(reports):
+            self.pending_reports = None
+            if DBManager.data_version() != version:
+                # written to while loading
+                return
+            if self.month_reports_version != version:
+                self.month_reports = {}
+                self.month_reports_version = version
+            self.month_reports.update(reports)
+
+        def on_error(error):
+            self.pending_reports = None
+            log_error(error)
+
+        when_done(self, future, on_loaded, on_error)
+
+    def get_cached_report(self, month):
+        if self.month_reports_version != DBManager.data_version():
+            self.month_reports = {}
+            self.month_reports_version = None
+            self.precompute_month_reports()
+            return None
+        return self.month_reports.get(month)
+
     def budget_summary(self, month):
-        df = get_budget_summary_df(month)
+        report = self.get_cached_report(month)
+        if report is not None:
+            self.pending_summary = None
+            self.show_budget_summary(
+                month, report.summary_df, report.spend_per_category_df
+            )
+            return
+        self.show_loading()
+        version = DBManager.data_version()
+        future = loader.submit(get_month_report, month)
+        self.pending_summary = future
+
+        def on_loaded(report):
+            # a newer month was submitted while this one was loading
+            if future is not self.pending_summary:
+                return
+            if self.month_reports_version == version:
+                self.month_reports[month] = report
+            self.show_budget_summary(
+                month, report.summary_df, report.spend_per_category_df
+            )
+
+        when_done(self, future, on_loaded)
+
+    def notify_range(self, start, end):
+        self.clear_figures()
+        self.range_summary(start, end)
+
+    def range_summary(self, start, end):
+        self.show_loading()
+        future = loader.submit(get_range_report, start, end)
+        self.pending_summary = future
+
+        def on_loaded(report):
+            # a newer month or range was submitted while this one was loading
+            if future is not self.pending_summary:
+                return
+            self.show_budget_summary(
+                report.month,
+                report.summary_df,
+                report.spend_per_category_df,
+                title=f"Budget Summary from {start} to {end}",
+            )
+
+        when_done(self, future, on_loaded)
+
+    def show_loading(self):
+        self.budget_frame.destroy()
+        self.budget_frame = tk.Frame(self)
+        self.budget_frame.pack(fill="both", expand=True)
+        tk.Label(self.budget_frame, text="Loading...", font=("Arial", 15)).pack(
+            pady=20
+        )
+
+    def show_budget_summary(self, month, df, spend_per_category_df, title=None):
+        """
+        month: YYYY-MM, or a label of the range of the summary if title is given
+        """
+        # charts use the summary in its original order,
+        # and the report is kept for the next visit of the month
+        summary_df = df
+        df = df.copy()
         self.budget_frame.destroy()
         self.budget_frame = tk.Frame(self)
         self.budget_frame.pack(fill="both", expand=True)
@@ -321,10 +600,12 @@ class Home(ABPage):
         # add header label
         header_frame = tk.Frame(self.budget_frame)
         header_frame.pack(fill="both", expand=True)
-        month_number = int(month.split("-")[1])
+        if title is None:
+            month_number = int(month.split("-")[1])
+            title = f"Budget Summary for {calendar.month_name[month_number]}, {month.split('-')[0]}"
         header_label = tk.Label(
             header_frame,
-            text=f"Budget Summary for {calendar.month_name[month_number]}, {month.split('-')[0]}",
+            text=title,
             font=("Arial", 20),
         )
         header_label.pack(side="top")
@@ -385,7 +666,7 @@ class Home(ABPage):
         # create frame for plot
         plot_frame = tk.Frame(upper_frame)
         plot_frame.pack(pady=10)
-        fig = get_budget_vs_spend_plt(month)
+        fig = get_budget_vs_spend_plt(month, summary_df)
         self.figures.append(fig)
         canvas = FigureCanvasTkAgg(fig, master=plot_frame)
         canvas.draw()
@@ -394,14 +675,14 @@ class Home(ABPage):
         lower_frame = tk.Frame(self.budget_frame)
         lower_frame.pack(fill="both", expand=True, side="bottom")
         # create pie chart
-        fig = get_spend_per_category_pie_chart_plt(month)
+        fig = get_spend_per_category_pie_chart_plt(month, spend_per_category_df)
         self.figures.append(fig)
         canvas = FigureCanvasTkAgg(fig, master=lower_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(side="left", fill="both", expand=True)
 
         # create budget - spend bar chart
-        fig = get_budget_minus_spend_bar_chart_plt(month)
+        fig = get_budget_minus_spend_bar_chart_plt(month, summary_df)
         self.figures.append(fig)
         canvas = FigureCanvasTkAgg(fig, master=lower_frame)
         canvas.draw()
@@ -410,25 +691,48 @@ class Home(ABPage):
     def setup(self):
         form = GenerateMonthlySummaryForm(self.frame)
         form.register_listener(self)
+        range_form = GenerateRangeSummaryForm(self.frame)
+        range_form.register_listener(self)
+        self.precompute_month_reports()
 
 
 class Transactions(ABPage):
     def __init__(self, parent):
         super().__init__(parent)
         self.plots_frame = None
+        self.pending_plots = None
 
     def setup(self):
+        export_button = tk.Button(
+            self.frame, text="Export to CSV", command=self.export_transactions
+        )
+        export_button.pack(side="top", pady=10)
         table_frame = EditableTable(
             self.frame,
             get_transactions_df,
             EditTransactionForm,
             extra_callback=self.show_plots,
+            get_page_func=get_transactions_page,
         )
         table_frame.pack(fill="both", expand=True, side="top")
 
-    def show_total_spent(self, data, frame):
-        # sum amount where
-        df = get_transactions_totals_df()
+    def export_transactions(self):
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv", filetypes=[("CSV Files", "*.csv")]
+        )
+        if not filename:
+            return
+        future = loader.submit(export_transactions_csv, filename)
+        when_done(
+            self.frame,
+            future,
+            lambda count: messagebox.showinfo(
+                "Export", f"Exported {count} transactions to {filename}"
+            ),
+            lambda error: messagebox.showerror("Export", str(error)),
+        )
+
+    def show_total_spent(self, df, frame):
         # spent is row where income = 0
         total_spent = df[df["income"] == 0]["total"].iloc[0]
         total_income = df[df["income"] == 1]["total"].iloc[0]
@@ -438,20 +742,45 @@ class Transactions(ABPage):
         total_earnt_label.pack(side="bottom", pady=10)
 
     def show_plots(self, data, frame):
+        if self.plots_frame:
+            self.plots_frame.destroy()
+        self.plots_frame = tk.Frame(self.frame)
+        self.plots_frame.pack(fill="both", expand=True, side="bottom")
+        tk.Label(self.plots_frame, text="Loading...", font=("Arial", 15)).pack(pady=20)
+        # all the totals come from a single scan
+        future = loader.submit(get_totals)
+        self.pending_plots = future
+
+        def on_loaded(totals):
+            if future is not self.pending_plots:
+                return
+            self.render_plots(
+                frame,
+                totals.totals_df,
+                totals.spend_per_category_df,
+                totals.income_vs_expenses_df,
+            )
+
+        when_done(self.frame, future, on_loaded)
+
+    def render_plots(
+        self, frame, totals_df, spend_per_category_df, income_vs_expenses_df
+    ):
         self.clear_figures()
-        self.show_total_spent(data, frame)
+        if frame.winfo_exists():
+            self.show_total_spent(totals_df, frame)
         if self.plots_frame:
             self.plots_frame.destroy()
 
         self.plots_frame = tk.Frame(self.frame)
         self.plots_frame.pack(fill="both", expand=True, side="bottom")
-        pie_chart_plt = get_spend_per_category_pie_chart_plt()
+        pie_chart_plt = get_spend_per_category_pie_chart_plt(df=spend_per_category_df)
         self.figures.append(pie_chart_plt)
         canvas = FigureCanvasTkAgg(pie_chart_plt, master=self.plots_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(side="top", fill="both", expand=True, pady=10)
 
-        income_vs_expenses_plt = get_income_vs_expenses_plt()
+        income_vs_expenses_plt = get_income_vs_expenses_plt(income_vs_expenses_df)
         self.figures.append(income_vs_expenses_plt)
         canvas = FigureCanvasTkAgg(income_vs_expenses_plt, master=self.plots_frame)
         canvas.draw()
@@ -488,6 +817,67 @@ class Budget(ABPage):
         canvas.get_tk_widget().pack(side="bottom", fill="both", expand=True, pady=10)
 
 
+class Year(ABPage):
+    """
+    Year at a glance: spend of every category in every month against its budget,
+    with the yearly totals, in a single figure
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.year = datetime.now().year
+        self.year_label = None
+        self.plot_frame = None
+        self.pending_summary = None
+
+    def setup(self):
+        controls = tk.Frame(self.frame)
+        controls.pack(side="top", pady=10)
+        tk.Button(
+            controls, text="<", command=lambda: self.show_year(self.year - 1)
+        ).pack(side="left")
+        self.year_label = tk.Label(controls, font=("Arial", 20))
+        self.year_label.pack(side="left", padx=20)
+        tk.Button(
+            controls, text=">", command=lambda: self.show_year(self.year + 1)
+        ).pack(side="left")
+        self.plot_frame = tk.Frame(self.frame)
+        self.plot_frame.pack(side="bottom", fill="both", expand=True)
+
+    def on_click(self):
+        # writes made on other pages show up on the next visit
+        self.show_year(self.year)
+
+    def show_year(self, year):
+        self.year = year
+        self.year_label.config(text=str(year))
+        self.plot_frame.destroy()
+        self.plot_frame = tk.Frame(self.frame)
+        self.plot_frame.pack(side="bottom", fill="both", expand=True)
+        tk.Label(self.plot_frame, text="Loading...", font=("Arial", 15)).pack(pady=20)
+        future = loader.submit(get_year_summary, year)
+        self.pending_summary = future
+
+        def on_loaded(summary):
+            # another year was picked while this one was loading
+            if future is not self.pending_summary:
+                return
+            self.render(summary)
+
+        when_done(self.frame, future, on_loaded)
+
+    def render(self, summary):
+        self.clear_figures()
+        self.plot_frame.destroy()
+        self.plot_frame = tk.Frame(self.frame)
+        self.plot_frame.pack(side="bottom", fill="both", expand=True)
+        fig = get_year_at_a_glance_plt(summary.year, summary)
+        self.figures.append(fig)
+        canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(side="bottom", fill="both", expand=True, pady=10)
+
+
 class Files(ABPage):
     def setup(self):
         table_frame = EditableTable(
@@ -5,37 +5,56 @@ from src.tools.text_classifier import SimpleClassifier, fuzzy_search
 logger = logging.getLogger("main").getChild(__name__)
 text_classifier = SimpleClassifier()
 
-def infer_categories(df, categories, db):
+class PreviousCategories:
+    """
+    Categories of the previous transactions that were not inferred, by code and by description.
+    Load once and pass to infer_categories for every chunk of a large batch
+    """
+
+    def __init__(self, db):
+        self.inferred_codes = {}
+        self.inferred_descriptions = {}
+        self.non_inferred_codes = {}
+        self.non_inferred_descriptions = {}
+        # read in chunks, only the lookups are kept in memory
+        for rows in db.select_chunks(
+            """
+                SELECT description, code, category FROM transactions
+                WHERE (code IS NOT NULL OR description IS NOT NULL)
+                AND inferred_category = 0
+            """,
+            [],
+        ):
+            for description, code, category in rows:
+                if code:
+                    self.non_inferred_codes[code] = category
+                if description:
+                    self.non_inferred_descriptions[description] = category
+                if category == "Other":
+                    continue
+                if code:
+                    self.inferred_codes[code] = category
+                if description:
+                    self.inferred_descriptions[description] = category
+
+
+def infer_categories(df, categories, db, previous=None):
     """
     Auto fill the category column when missing.
     If the category is already in the db, use that
     If the code is the same as a previous transaction (fuzzy search), use that category
     Otherwise, use NLP to infer category
+    previous: PreviousCategories, loaded from db if not given.
+    Categories inferred with NLP are added to it
     """
 
-    prev_inferred_transactions = db.select(
-        """
-            SELECT description, code, category FROM transactions
-            WHERE (code IS NOT NULL OR description IS NOT NULL)
-            AND category != 'Other'
-            AND inferred_category = 0
-        """,
-        [],
-    )
-    prev_non_inferred_transactions = db.select(
-        """
-            SELECT description, code, category FROM transactions
-            WHERE (code IS NOT NULL OR description IS NOT NULL)
-            AND inferred_category = 0
-        """,
-        [],
-    )
+    previous = previous or PreviousCategories(db)
+    prev_inferred_codes = previous.inferred_codes
+    prev_inferred_descriptions = previous.inferred_descriptions
+    prev_non_inferred_codes = previous.non_inferred_codes
+    prev_non_inferred_descriptions = previous.non_inferred_descriptions
     new_categories = []
     inferred_categories = []
-    prev_inferred_codes = {row[1]: row[2] for row in prev_inferred_transactions if row[1]}
-    prev_inferred_descriptions = {row[0]: row[2] for row in prev_inferred_transactions if row[0]}
-    prev_non_inferred_codes = {row[1]: row[2] for row in prev_non_inferred_transactions if row[1]}
-    prev_non_inferred_descriptions = {row[0]: row[2] for row in prev_non_inferred_transactions if row[0]}
     for _, row in df.iterrows():
         logger.debug("Infering category for\n %s", row)
         if row["Category"] in categories:
@@ -0,0 +1,114 @@
+"""
+    Fixtures shared by the tests. Run them from the repo root: python -m pytest
+"""
+
+# pytest passes fixtures as arguments named like the fixture functions
+# pylint: disable=redefined-outer-name
+import random
+import pytest
+from src.db.dbmanager import DBManager
+from src.db.dates import day_num
+from src.db.queries import QUERIES
+
+CATEGORIES = ["Groceries", "Rent", "Salary", "Travel"]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    A new database, created from schema.sql and migrated to the latest version
+    """
+    monkeypatch.setenv("DB_FILE", str(tmp_path / "test.db"))
+    # the random writes are not what the slow query log is for
+    monkeypatch.setenv("DB_SLOW_QUERY_MS", "60000")
+    yield DBManager()
+    DBManager.close_all()
+
+
+def random_date(rng: random.Random) -> str:
+    return f"{rng.randint(2021, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def insert_transaction(db: DBManager, rng: random.Random, date=None, category=None):
+    date = date or random_date(rng)
+    db.insert(
+        """
+            INSERT INTO transactions (date, description, amount, category, day_num)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+        [
+            date,
+            "test",
+            rng.randint(-5000, 50000),
+            category or rng.choice(CATEGORIES),
+            day_num(date),
+        ],
+    )
+
+
+def random_write(db: DBManager, rng: random.Random):
+    """
+    One of the writes the app makes: a transaction is added, moved to another day
+    or category, changed or deleted, or a category is added or renamed.
+    Transactions may be in categories that are not in CATEGORIES
+    """
+    ids = [row[0] for row in db.select("SELECT id FROM transactions", [])]
+    categories = [row[0] for row in db.select("SELECT category FROM categories", [])]
+    action = rng.random()
+    if action < 0.35 or not ids:
+        insert_transaction(db, rng, category=rng.choice(CATEGORIES + categories[:3]))
+    elif action < 0.55:
+        date = random_date(rng)
+        db.update(
+            "UPDATE transactions SET date = ?, day_num = ?, amount = ? WHERE id = ?",
+            [date, day_num(date), rng.randint(-5000, 50000), rng.choice(ids)],
+        )
+    elif action < 0.7:
+        db.update(
+            "UPDATE transactions SET category = ? WHERE id = ?",
+            [rng.choice(CATEGORIES), rng.choice(ids)],
+        )
+    elif action < 0.85:
+        db.delete("DELETE FROM transactions WHERE id = ?", [rng.choice(ids)])
+    elif action < 0.9:
+        # several statements committed at once
+        with db.transaction():
+            insert_transaction(db, rng)
+            db.delete("DELETE FROM transactions WHERE id = ?", [rng.choice(ids)])
+    elif action < 0.94:
+        # a rolled back block changes nothing
+        with pytest.raises(ValueError):
+            with db.transaction():
+                insert_transaction(db, rng, date="2030-01-01")
+                raise ValueError
+    elif action < 0.97:
+        db.insert(
+            "INSERT INTO categories (category, income) VALUES (?, ?)",
+            [f"New {rng.getrandbits(32)}", rng.randint(0, 1)],
+        )
+    elif action < 0.985:
+        # the categories form renames a category, its transactions keep the old name
+        db.update(
+            QUERIES.get("update_category"),
+            {
+                "category": f"Renamed {rng.getrandbits(32)}",
+                "description": "",
+                "income": rng.randint(0, 1),
+                "old_category": rng.choice(categories),
+            },
+        )
+    else:
+        # move every transaction of a category to another one
+        db.update(
+            "UPDATE transactions SET category = ? WHERE category = ?",
+            [rng.choice(categories), rng.choice(CATEGORIES)],
+        )
+
+
+@pytest.fixture
+def seeded_db(db):
+    rng = random.Random(0)
+    with db.transaction():
+        for _ in range(500):
+            insert_transaction(db, rng)
+    return db
@@ -0,0 +1,97 @@
+import random
+import numpy as np
+from src.db.daily_spending import DailySpending, sync
+from src.db.dates import day_num
+from tests.conftest import random_write, insert_transaction
+
+FIRST_DAY = day_num("2018-01-01")
+LAST_DAY = day_num("2031-12-31")
+
+
+def by_category(spending: DailySpending, start_day: int, end_day: int) -> dict:
+    """
+    category -> (total, count) from start_day to end_day, categories without transactions left out
+    """
+    totals = spending.range_totals(start_day, end_day)
+    counts = spending.range_counts(start_day, end_day)
+    return {
+        category: (int(totals[i]), int(counts[i]))
+        for i, category in enumerate(spending.categories)
+        if counts[i]
+    }
+
+
+def random_ranges(rng: random.Random, count: int):
+    for _ in range(count):
+        start = rng.randint(FIRST_DAY, LAST_DAY)
+        yield start, rng.randint(start, min(start + 400, LAST_DAY))
+
+
+def assert_same(synced: DailySpending, db, rng: random.Random):
+    rebuilt = DailySpending.load(db)
+    assert synced.seq == rebuilt.seq
+    # the days axis of synced sums may be wider than the rebuilt one
+    for start, end in [(FIRST_DAY, LAST_DAY), *random_ranges(rng, 50)]:
+        assert by_category(synced, start, end) == by_category(rebuilt, start, end)
+
+
+def test_sync_matches_rebuild_after_random_writes(seeded_db):
+    rng = random.Random(1)
+    spending = DailySpending.load(seeded_db)
+    for _ in range(40):
+        for _ in range(rng.randint(1, 10)):
+            random_write(seeded_db, rng)
+        spending = sync(spending, seeded_db)
+        assert_same(spending, seeded_db, rng)
+
+
+def test_ranges_match_transactions(seeded_db):
+    rng = random.Random(2)
+    spending = DailySpending.load(seeded_db)
+    for _ in range(100):
+        random_write(seeded_db, rng)
+    spending = sync(spending, seeded_db)
+    for start, end in random_ranges(rng, 50):
+        expected = {
+            category: (total, count)
+            for category, total, count in seeded_db.select(
+                """
+                    SELECT category, SUM(amount), COUNT(*) FROM transactions
+                    WHERE day_num BETWEEN ? AND ?
+                    GROUP BY category
+                """,
+                [start, end],
+            )
+        }
+        assert by_category(spending, start, end) == expected
+
+
+def test_sync_outside_the_days_axis(seeded_db):
+    rng = random.Random(3)
+    spending = DailySpending.load(seeded_db)
+    # checked one at a time: a category outside the axis rebuilds the sums
+    for date, category in (
+        ("2019-06-15", "Groceries"),
+        ("2027-02-01", "Groceries"),
+        ("2022-03-03", "Unknown"),
+    ):
+        insert_transaction(seeded_db, rng, date=date, category=category)
+        spending = sync(spending, seeded_db)
+        assert_same(spending, seeded_db, rng)
+    seeded_db.delete("DELETE FROM transactions WHERE date < '2020-01-01'", [])
+    spending = sync(spending, seeded_db)
+    assert_same(spending, seeded_db, rng)
+
+
+def test_sync_from_no_transactions(db):
+    rng = random.Random(4)
+    spending = DailySpending.load(db)
+    assert not by_category(spending, FIRST_DAY, LAST_DAY)
+    insert_transaction(db, rng, date="2022-03-03", category="Groceries")
+    insert_transaction(db, rng, date="2021-01-01", category="Groceries")
+    spending = sync(spending, db)
+    assert_same(spending, db, rng)
+    assert np.array_equal(
+        spending.range_counts(day_num("2022-03-03"), day_num("2022-03-03")),
+        (spending.categories == "Groceries").astype(np.int64),
+    )
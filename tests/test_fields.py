@@ -0,0 +1,16 @@
+import pytest
+from src.db.dbmanager import to_cents
+from src.form.fields import NumberField
+
+
+@pytest.mark.parametrize("value", ["12", "12.5", "0.005", "1000.00"])
+def test_valid_amounts_convert_to_cents(value):
+    field = NumberField("amount", True, None)
+    assert field.validate_value(value) == (True, None)
+    to_cents(value)
+
+
+@pytest.mark.parametrize("value", ["1.2.3", "..", ".", "", "abc", "1,5"])
+def test_invalid_amounts_rejected(value):
+    field = NumberField("amount", True, None)
+    assert field.validate_value(value)[0] is False
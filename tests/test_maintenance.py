@@ -0,0 +1,28 @@
+from src.db import spending_cube, daily_spending
+from src.db.maintenance import Maintenance
+
+
+def change_counts(db) -> tuple[int, int]:
+    return (
+        db.select("SELECT COUNT(*) FROM spending_changes", [])[0][0],
+        db.select("SELECT COUNT(*) FROM daily_spending_changes", [])[0][0],
+    )
+
+
+def test_logs_are_kept_without_summaries(seeded_db, monkeypatch):
+    # like maintenance.py run while the app is open: the app may not have applied them
+    monkeypatch.setattr(spending_cube, "applied_seq", lambda: None)
+    monkeypatch.setattr(daily_spending, "applied_seq", lambda: None)
+    before = change_counts(seeded_db)
+    assert all(before)
+    Maintenance(seeded_db).prune_change_logs()
+    assert change_counts(seeded_db) == before
+
+
+def test_only_applied_rows_are_pruned(seeded_db, monkeypatch):
+    monkeypatch.setattr(spending_cube, "applied_seq", lambda: 100)
+    monkeypatch.setattr(daily_spending, "applied_seq", lambda: 200)
+    before = change_counts(seeded_db)
+    Maintenance(seeded_db).prune_change_logs()
+    assert change_counts(seeded_db) == (before[0] - 100, before[1] - 200)
+    assert seeded_db.select("SELECT MIN(seq) FROM spending_changes", [])[0][0] == 101
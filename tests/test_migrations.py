@@ -0,0 +1,96 @@
+# pytest passes fixtures as arguments named like the fixture functions
+# pylint: disable=redefined-outer-name
+import shutil
+import sqlite3
+import pytest
+from src.db import migrator
+from src.db.dbmanager import DBManager, to_cents
+
+AMOUNTS = [12.34, 1.005, 0.125, -2.675, -0.5, 0, 19999.99, 0.1 + 0.2]
+
+
+def migrate_to(conn: sqlite3.Connection, version: int, tmp_path):
+    """
+    Apply the migrations up to version, from a copy of the migrations folder
+    """
+    migrations_dir = tmp_path / f"migrations_{version}"
+    migrations_dir.mkdir()
+    for number, _, path in migrator.get_migrations():
+        if number <= version:
+            shutil.copy(path, migrations_dir)
+    migrator.migrate(conn, str(migrations_dir))
+
+
+@pytest.fixture
+def version_2_db(tmp_path):
+    """
+    A database at version 2, when amounts were stored as DECIMAL
+    """
+    conn = sqlite3.connect(tmp_path / "old.db")
+    with open(DBManager.SCHEMA, "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    migrate_to(conn, 2, tmp_path)
+    conn.executemany(
+        """
+            INSERT INTO transactions (id, date, description, amount, category)
+            VALUES (?, '2024-01-15', 'test', ?, 'Groceries')
+        """,
+        [(i * 2 + 1, amount) for i, amount in enumerate(AMOUNTS)],
+    )
+    conn.executemany(
+        "INSERT INTO budgets (category, amount, start_date) VALUES (?, ?, ?)",
+        [("Groceries", amount, f"20{10 + i}-01") for i, amount in enumerate(AMOUNTS)],
+    )
+    # a deleted transaction, its id must not be reused
+    conn.execute("DELETE FROM transactions WHERE id = ?", [len(AMOUNTS) * 2 - 1])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_amounts_are_converted_like_to_cents(version_2_db, tmp_path):
+    migrate_to(version_2_db, 3, tmp_path)
+    transactions = version_2_db.execute(
+        "SELECT id, amount FROM transactions ORDER BY id"
+    ).fetchall()
+    expected = [(i * 2 + 1, to_cents(amount)) for i, amount in enumerate(AMOUNTS)]
+    assert transactions == expected[:-1]
+    budgets = version_2_db.execute(
+        "SELECT amount FROM budgets ORDER BY start_date"
+    ).fetchall()
+    assert [row[0] for row in budgets] == [to_cents(amount) for amount in AMOUNTS]
+    assert all(isinstance(amount, int) for _, amount in transactions)
+
+
+def test_ids_are_not_reused(version_2_db, tmp_path):
+    migrate_to(version_2_db, 3, tmp_path)
+    version_2_db.execute(
+        """
+            INSERT INTO transactions (date, description, amount, category)
+            VALUES ('2024-02-01', 'new', 100, 'Groceries')
+        """
+    )
+    new_id = version_2_db.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+    assert new_id == len(AMOUNTS) * 2
+
+
+def test_migrating_to_the_latest_version(version_2_db, tmp_path):
+    latest = migrator.get_migrations()[-1][0]
+    migrate_to(version_2_db, latest, tmp_path)
+    totals = version_2_db.execute(
+        "SELECT month, total, count FROM monthly_category_totals"
+    ).fetchall()
+    expected = sum(to_cents(amount) for amount in AMOUNTS[:-1])
+    assert totals == [("2024-01", expected, len(AMOUNTS) - 1)]
+
+
+def test_latest_version_keeps_the_category_date_index(version_2_db, tmp_path):
+    latest = migrator.get_migrations()[-1][0]
+    migrate_to(version_2_db, latest, tmp_path)
+    indexes = {
+        row[1] for row in version_2_db.execute("PRAGMA index_list(transactions)")
+    }
+    assert "IDX_TRANSACTIONS_CATEGORY_DATE" in indexes
+    assert "IDX_TRANSACTIONS_DAY_NUM" in indexes
+    columns = {row[1] for row in version_2_db.execute("PRAGMA table_info(transactions)")}
+    assert "MONTH_KEY" not in columns
@@ -0,0 +1,87 @@
+import random
+import numpy as np
+from src.db.spending_cube import SpendingCube, sync
+from tests.conftest import random_write, insert_transaction
+
+
+def cells(cube: SpendingCube) -> dict:
+    """
+    (month, category) -> (total, count) of the cells with transactions,
+    the axes of a synced cube may be wider than those of a rebuilt one
+    """
+    rows, cols = np.nonzero(cube.counts)
+    return {
+        (cube.months[row], cube.categories[col]): (
+            int(cube.totals[row, col]),
+            int(cube.counts[row, col]),
+        )
+        for row, col in zip(rows, cols)
+    }
+
+
+def income_flags(cube: SpendingCube) -> dict:
+    return dict(zip(cube.categories, cube.income.tolist()))
+
+
+def assert_same(synced: SpendingCube, db):
+    rebuilt = SpendingCube.load(db)
+    assert cells(synced) == cells(rebuilt)
+    flags = income_flags(synced)
+    for category, income in income_flags(rebuilt).items():
+        assert flags[category] == income, category
+    assert synced.seq == rebuilt.seq
+
+
+def test_sync_matches_rebuild_after_random_writes(seeded_db):
+    rng = random.Random(1)
+    cube = SpendingCube.load(seeded_db)
+    for _ in range(40):
+        for _ in range(rng.randint(1, 10)):
+            random_write(seeded_db, rng)
+        cube = sync(cube, seeded_db)
+        assert_same(cube, seeded_db)
+
+
+def test_sync_matches_totals_of_transactions(seeded_db):
+    rng = random.Random(2)
+    cube = SpendingCube.load(seeded_db)
+    for _ in range(100):
+        random_write(seeded_db, rng)
+    cube = sync(cube, seeded_db)
+    expected = {
+        (month, category): (total, count)
+        for month, category, total, count in seeded_db.select(
+            """
+                SELECT strftime('%Y-%m', date), category, SUM(amount), COUNT(*)
+                FROM transactions
+                GROUP BY 1, 2
+            """,
+            [],
+        )
+    }
+    assert cells(cube) == expected
+
+
+def test_sync_outside_the_axes(seeded_db):
+    rng = random.Random(3)
+    cube = SpendingCube.load(seeded_db)
+    # an older month, a later one, and a category that is not in CATEGORIES
+    # checked one at a time: a category outside the axis rebuilds the cube
+    for date, category in (
+        ("2019-06-15", "Groceries"),
+        ("2027-02-01", "Groceries"),
+        ("2022-03-03", "Unknown"),
+    ):
+        insert_transaction(seeded_db, rng, date=date, category=category)
+        cube = sync(cube, seeded_db)
+        assert_same(cube, seeded_db)
+    seeded_db.delete("DELETE FROM transactions WHERE date < '2020-01-01'", [])
+    cube = sync(cube, seeded_db)
+    assert_same(cube, seeded_db)
+
+
+def test_sync_without_changes_keeps_the_arrays(seeded_db):
+    cube = SpendingCube.load(seeded_db)
+    synced = sync(cube, seeded_db, version=1)
+    assert synced.totals is cube.totals
+    assert synced.version == 1
@@ -0,0 +1,67 @@
+# pytest passes fixtures as arguments named like the fixture functions
+# pylint: disable=redefined-outer-name
+import importlib
+import random
+import pytest
+from src.db.async_data import loader
+from tests.conftest import insert_transaction
+
+PAGE_SIZE = 40
+
+
+@pytest.fixture
+def summarizer(db, monkeypatch):
+    """
+    data_summarizer, reading from the test database.
+    Imported here, its module level DBManager needs DB_FILE
+    """
+    module = importlib.import_module("src.db.data_summarizer")
+    monkeypatch.setattr(module, "db", db)
+    return module
+
+
+def load_page(summarizer, after=None, filters=None, sort="desc"):
+    """
+    Load a page the way EditableTable does, on the loader thread with keyword arguments
+    """
+    return loader.submit(
+        summarizer.get_transactions_page,
+        after=after,
+        limit=PAGE_SIZE,
+        filters=dict(filters or {}),
+        sort=sort,
+    ).result()
+
+
+def load_all(summarizer, filters=None, sort="desc") -> list[tuple[str, int]]:
+    rows = []
+    df, cursor = load_page(summarizer, filters=filters, sort=sort)
+    rows.extend(zip(df["date"], df["id"]))
+    while cursor is not None:
+        df, cursor = load_page(summarizer, after=cursor, filters=filters, sort=sort)
+        rows.extend(zip(df["date"], df["id"]))
+    return rows
+
+
+def test_pages_cover_the_listing_in_order(db, summarizer):
+    rng = random.Random(0)
+    with db.transaction():
+        for _ in range(PAGE_SIZE * 3 + 7):
+            insert_transaction(db, rng)
+    expected = db.select("SELECT date, id FROM transactions ORDER BY date, id", [])
+    expected = [tuple(row) for row in expected]
+    assert load_all(summarizer, sort="asc") == expected
+    assert load_all(summarizer, sort="desc") == expected[::-1]
+
+
+def test_filters_apply_to_every_page(db, summarizer):
+    rng = random.Random(1)
+    with db.transaction():
+        for _ in range(PAGE_SIZE * 2 + 3):
+            insert_transaction(db, rng)
+    expected = db.select(
+        "SELECT date, id FROM transactions WHERE category = 'Rent' ORDER BY date, id",
+        [],
+    )
+    rows = load_all(summarizer, filters={"category": "Rent"}, sort="asc")
+    assert rows == [tuple(row) for row in expected]